@@ -0,0 +1,62 @@
+"""chat history indexes
+
+Composite indexes for keyset pagination of chat sessions and messages.
+Both are built CONCURRENTLY so that existing chat tables stay writable
+while the index is created.
+
+`chat_messages.created_at` becomes NOT NULL without a long lock: NULLs are
+backfilled in small committed batches, a NOT VALID check constraint is
+validated while writes continue, and SET NOT NULL then relies on that
+constraint (PostgreSQL 12+) instead of scanning the table under an ACCESS
+EXCLUSIVE lock. The remaining exclusive locks are held only briefly.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-07-02 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+BACKFILL_BATCH_SIZE = 5000
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keyset cursors compare (created_at, id), which is undefined for NULL timestamps
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        while True:
+            backfilled = bind.execute(sa.text(
+                "UPDATE chat_messages SET created_at = now() WHERE id IN "
+                "(SELECT id FROM chat_messages WHERE created_at IS NULL LIMIT :batch)"
+            ), {"batch": BACKFILL_BATCH_SIZE}).rowcount
+            if not backfilled:
+                break
+
+        op.execute("ALTER TABLE chat_messages ADD CONSTRAINT chat_messages_created_at_not_null "
+                   "CHECK (created_at IS NOT NULL) NOT VALID")
+        op.execute("ALTER TABLE chat_messages VALIDATE CONSTRAINT chat_messages_created_at_not_null")
+        op.alter_column('chat_messages', 'created_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+        op.drop_constraint('chat_messages_created_at_not_null', 'chat_messages', type_='check')
+
+        op.create_index('ix_chat_sessions_user_created_id', 'chat_sessions', ['user_id', 'created_at', 'id'],
+                        unique=False, postgresql_include=['agent_id'], postgresql_concurrently=True)
+        op.create_index('ix_chat_messages_session_created_id', 'chat_messages', ['session_id', 'created_at', 'id'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_chat_messages_session_created_id', table_name='chat_messages', postgresql_concurrently=True)
+        op.drop_index('ix_chat_sessions_user_created_id', table_name='chat_sessions', postgresql_concurrently=True)
+
+    op.alter_column('chat_messages', 'created_at', existing_type=sa.DateTime(timezone=True), nullable=True)
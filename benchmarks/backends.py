@@ -0,0 +1,112 @@
+"""
+Compare CPU inference backends for speech-to-text and text-to-speech.
+
+Each backend is loaded in turn, warmed up once and timed over the given
+inputs. Accuracy drift is measured against the full-precision "torch"
+backend: word error rate between transcripts for STT, and the relative
+difference in generated speech duration for TTS.
+
+    python -m benchmarks.backends --audio samples/*.wav --texts "Hello there." "How can I help?"
+"""
+import time
+import argparse
+import statistics
+import numpy as np
+import torch
+
+from src.model import models, ensure_model_exists, __load_tts_processor__, __load_vocoder__
+from src.speech.audio import TARGET_SAMPLE_RATE, load_audio
+from src.speech.backends import STT_BACKENDS, TTS_BACKENDS, load_stt, load_tts
+from src.speech.speakers import SpeakerStore
+from src.config import model_settings
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    ref, hyp = reference.lower().split(), hypothesis.lower().split()
+    if not ref:
+        return float(bool(hyp))
+    distances = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        previous, distances[0] = distances[0], i
+        for j, hyp_word in enumerate(hyp, 1):
+            previous, distances[j] = distances[j], min(
+                distances[j] + 1,
+                distances[j - 1] + 1,
+                previous + (ref_word != hyp_word),
+            )
+    return distances[-1] / len(ref)
+
+def percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+def report(kind: str, backend: str, latencies: list[float], total_s: float, items: int, drift: str):
+    print(
+        f"{kind:<4} {backend:<6} p50 {percentile(latencies, 50) * 1000:8.1f} ms  "
+        f"p95 {percentile(latencies, 95) * 1000:8.1f} ms  "
+        f"throughput {items / total_s if total_s else 0:7.2f}/s  {drift}"
+    )
+
+def bench_stt(paths: list[str], backends: list[str], batch_size: int):
+    ensure_model_exists(*models["stt"])
+    clips = [{"raw": audio, "sampling_rate": TARGET_SAMPLE_RATE} for audio, _ in map(load_audio, paths)]
+    references = None
+    for backend in backends:
+        transcriber = load_stt(models["stt"][0], backend)
+        transcriber(dict(clips[0]))  # warm-up
+
+        latencies, transcripts = [], []
+        for clip in clips:
+            start = time.perf_counter()
+            transcripts.append(transcriber(dict(clip))["text"])
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        transcriber([dict(clip) for clip in clips], batch_size=batch_size)
+        batched_s = time.perf_counter() - start
+
+        if references is None:
+            references = transcripts
+        wer = statistics.mean(word_error_rate(ref, hyp) for ref, hyp in zip(references, transcripts))
+        report("stt", backend, latencies, batched_s, len(clips), f"WER vs torch {wer:.3f}")
+
+def bench_tts(texts: list[str], backends: list[str]):
+    ensure_model_exists(*models["tts"])
+    processor, vocoder = __load_tts_processor__(), __load_vocoder__()
+    speaker = SpeakerStore(model_settings.SPEAKER_STORE_PATH).load().get(model_settings.DEFAULT_SPEAKER_ID)
+    inputs = [processor(text=text, return_tensors="pt")["input_ids"] for text in texts]
+    reference_durations = None
+    for backend in backends:
+        model = load_tts(models["tts"][0], backend)
+        with torch.inference_mode():
+            model.generate_speech(inputs[0], speaker, vocoder=vocoder)  # warm-up
+            latencies, durations = [], []
+            for input_ids in inputs:
+                start = time.perf_counter()
+                speech = model.generate_speech(input_ids, speaker, vocoder=vocoder)
+                latencies.append(time.perf_counter() - start)
+                durations.append(speech.shape[-1] / TARGET_SAMPLE_RATE)
+
+        if reference_durations is None:
+            reference_durations = durations
+        drift = statistics.mean(abs(d - ref) / ref for d, ref in zip(durations, reference_durations) if ref)
+        rtf = sum(latencies) / sum(durations)
+        report("tts", backend, latencies, sum(latencies), len(texts), f"RTF {rtf:.2f}  duration drift vs torch {drift:.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--audio", nargs="*", default=[], help="audio files for the STT benchmark")
+    parser.add_argument("--texts", nargs="*", default=[], help="sentences for the TTS benchmark")
+    parser.add_argument("--stt-backends", nargs="+", default=list(STT_BACKENDS), choices=STT_BACKENDS)
+    parser.add_argument("--tts-backends", nargs="+", default=list(TTS_BACKENDS), choices=TTS_BACKENDS)
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    # The first backend is the accuracy reference, so keep full precision first.
+    stt_backends = sorted(args.stt_backends, key=lambda backend: backend != "torch")
+    tts_backends = sorted(args.tts_backends, key=lambda backend: backend != "torch")
+    if args.audio:
+        bench_stt(args.audio, stt_backends, args.batch_size)
+    if args.texts:
+        bench_tts(args.texts, tts_backends)
+
+if __name__ == "__main__":
+    main()
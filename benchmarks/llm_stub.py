@@ -0,0 +1,76 @@
+"""
+Stand-in for the LLM stream server the chat relay talks to.
+
+Speaks the same protocol as the real service: the client sends
+`{"text": ...}` and receives the reply as JSON string tokens followed by
+`{"end_of_stream": true}`, after which the connection can be reused.
+
+    python -m benchmarks.llm_stub --port 2222 --tokens-per-second 40 --reply-tokens 200 --error-rate 0.01
+"""
+import json
+import random
+import asyncio
+import argparse
+import websockets
+
+WORDS = "the quick brown fox jumps over a lazy dog while jarvis explains how streaming replies work".split()
+
+class StubConfig:
+    def __init__(self, args: argparse.Namespace):
+        self.token_interval = 1.0 / args.tokens_per_second if args.tokens_per_second > 0 else 0.0
+        self.reply_tokens = args.reply_tokens
+        self.first_token_delay = args.first_token_delay_ms / 1000
+        self.jitter = args.jitter
+        self.error_rate = args.error_rate
+        self.drop_rate = args.drop_rate
+        self.echo = args.echo
+
+async def serve_reply(websocket, config: StubConfig, text: str):
+    if config.error_rate and random.random() < config.error_rate:
+        await websocket.send(json.dumps({"error": "injected failure"}))
+        await websocket.close(code=1011)
+        return
+    drop_at = random.randrange(config.reply_tokens) if config.drop_rate and random.random() < config.drop_rate else None
+
+    await asyncio.sleep(config.first_token_delay)
+    prompt_words = text.split() if config.echo else []
+    for i in range(config.reply_tokens):
+        if i == drop_at:
+            await websocket.close(code=1011)
+            return
+        word = prompt_words[i] if i < len(prompt_words) else random.choice(WORDS)
+        await websocket.send(json.dumps(word + " "))
+        if config.token_interval:
+            await asyncio.sleep(config.token_interval * random.uniform(1 - config.jitter, 1 + config.jitter))
+    await websocket.send(json.dumps({"end_of_stream": True}))
+
+def make_handler(config: StubConfig):
+    async def handler(websocket):
+        if websocket.request.path != "/stream":
+            await websocket.close(code=1008)
+            return
+        async for message in websocket:
+            await serve_reply(websocket, config, json.loads(message).get("text", ""))
+    return handler
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--tokens-per-second", type=float, default=40.0, help="0 streams as fast as possible")
+    parser.add_argument("--reply-tokens", type=int, default=200)
+    parser.add_argument("--first-token-delay-ms", type=float, default=150.0)
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative jitter of the token interval")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of failing a reply up front")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="probability of dropping the connection mid-reply")
+    parser.add_argument("--echo", action="store_true", help="start each reply with the prompt words")
+    args = parser.parse_args()
+    if args.reply_tokens < 1:
+        parser.error("--reply-tokens must be at least 1")
+
+    async with websockets.serve(make_handler(StubConfig(args)), args.host, args.port):
+        print(f"LLM stub streaming on ws://{args.host}:{args.port}/stream")
+        await asyncio.Future()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+"""
+Load generator for the `/ws_sendMessages` chat endpoint.
+
+Logs N users in through `/auth/jwt/login` (registering them first with
+`--register`), opens one authenticated WebSocket session per user and
+sends `--messages` prompts on each. Reports time-to-first-token,
+inter-delta gap percentiles and throughput. Run it against the
+server backed by `benchmarks.llm_stub` to measure the relay on its own.
+
+The server coalesces tokens into deltas (`CHAT_FLUSH_INTERVAL_MS`,
+`CHAT_FLUSH_BYTES`), so the gap between deltas mostly reflects the flush
+window. Start the server with `CHAT_FLUSH_INTERVAL_MS=0` to send one frame
+per token; the gap is then the inter-token latency.
+
+    python -m benchmarks.ws_load --sessions 50 --messages 5 --register
+"""
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+import httpx
+import websockets
+
+class Results:
+    def __init__(self):
+        self.ttft: list[float] = []
+        self.gaps: list[float] = []
+        self.chars = 0
+        self.replies = 0
+        self.errors = 0
+
+async def login(client: httpx.AsyncClient, index: int, args: argparse.Namespace) -> str:
+    email = f"{args.user_prefix}{index}@example.com"
+    if args.register:
+        response = await client.post("/auth/register", json={
+            "email": email, "password": args.password, "username": f"{args.user_prefix}{index}",
+        })
+        if response.status_code not in (201, 400):  # 400: already registered
+            raise RuntimeError(f"Registering {email} failed: {response.status_code} {response.text}")
+    response = await client.post("/auth/jwt/login", data={"username": email, "password": args.password})
+    response.raise_for_status()
+    return response.cookies["bonds"]
+
+async def run_session(cookie: str, args: argparse.Namespace, results: Results):
+    ws_url = args.url.replace("http", "ws", 1) + "/ws_sendMessages"
+    async with websockets.connect(ws_url, additional_headers={"Cookie": f"bonds={cookie}"}) as websocket:
+        for i in range(args.messages):
+            start = last = time.perf_counter()
+            first = True
+            await websocket.send(json.dumps({"role": "user", "content": f"{args.prompt} #{i}", "metadata": "None"}))
+            while True:
+                frame = json.loads(await websocket.recv())
+                if "Error" in frame:
+                    results.errors += 1
+                    break
+                delta = frame.get("response")
+                if isinstance(delta, dict):
+                    if delta.get("end_of_stream"):
+                        results.replies += 1
+                        break
+                    continue
+                if not isinstance(delta, str):
+                    continue  # room announcements and other frames
+                now = time.perf_counter()
+                if first:
+                    results.ttft.append(now - start)
+                    first = False
+                else:
+                    results.gaps.append(now - last)
+                last = now
+                results.chars += len(delta)
+
+def summarize(name: str, values: list[float]) -> str:
+    if not values:
+        return f"{name:<22} n/a"
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+    return f"{name:<22} p50 {p50:8.1f} ms  p95 {p95:8.1f} ms  p99 {p99:8.1f} ms  (n={len(values)})"
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=3, help="prompts sent sequentially on each session")
+    parser.add_argument("--prompt", default="Tell me something interesting")
+    parser.add_argument("--register", action="store_true", help="register the load-test users first")
+    parser.add_argument("--user-prefix", default="loadtest")
+    parser.add_argument("--password", default="loadtest-password")
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=30) as client:
+        cookies = await asyncio.gather(*(login(client, i, args) for i in range(args.sessions)))
+
+    results = Results()
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*(run_session(cookie, args, results) for cookie in cookies), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    failed_sessions = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+
+    print(f"sessions {args.sessions}, replies {results.replies}, errors {results.errors}, "
+          f"failed sessions {len(failed_sessions)}, elapsed {elapsed:.2f} s")
+    print(summarize("time to first token", results.ttft))
+    print(summarize("inter-delta gap", results.gaps))
+    print(f"{'throughput':<22} {results.replies / elapsed:8.2f} replies/s  {results.chars / elapsed:10.1f} chars/s")
+    for outcome in failed_sessions[:5]:
+        print(f"  session failed: {outcome!r}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
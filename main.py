@@ -1,7 +1,24 @@
 import uvicorn
+from multiprocessing import Process
 
 if __name__ == "__main__":
-    uvicorn.run("server:app", host="127.0.0.1", port=8000, workers=2, log_level="debug")
-    # ssl_keyfile="ssl/key.pem",
-    # reload=True,
-    # ssl_certfile="ssl/cert.pem")
\ No newline at end of file
+    from src.config import model_settings, chat_settings
+
+    sidecars = []
+    if model_settings.INFERENCE_MODE == "worker":
+        from src.speech.worker import run_worker
+        sidecars.append(Process(target=run_worker, name="inference-worker", daemon=True))
+    if chat_settings.PUBSUB_BACKEND == "unix":
+        from src.pubsub import run_broker
+        sidecars.append(Process(target=run_broker, name="pubsub-broker", daemon=True))
+    for sidecar in sidecars:
+        sidecar.start()
+
+    try:
+        uvicorn.run("server:app", host="127.0.0.1", port=8000, workers=2, log_level="debug")
+        # ssl_keyfile="ssl/key.pem",
+        # reload=True,
+        # ssl_certfile="ssl/cert.pem")
+    finally:
+        for sidecar in sidecars:
+            sidecar.terminate()
@@ -1,38 +1,60 @@
-import json
 import time
-import websockets
+import uuid
+import asyncio
 from huggingface_hub import login
-from sqlalchemy.sql.expression import select
 from contextlib import asynccontextmanager
 from src.auth.manager import get_user_manager
-from src.auth.models import UserSettings
-from sqlalchemy.ext.asyncio import AsyncSession
-from src.database import get_async_session, fetch_roles
+from src.database import fetch_roles, database_stats
 from gradio import mount_gradio_app
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, Request
-from src.auth.schemas import UserRead, UserCreate, UserUpdate
-from src.auth.base_config import auth_backend, fastapi_users, current_active_user, get_current_user, get_jwt_strategy
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, Request, Header, HTTPException, Response
+from src.auth.schemas import UserRead, UserCreate, UserUpdate, BulkUserCreate, BulkUserCreateResult
+from src.auth.base_config import auth_backend, fastapi_users, current_active_user, current_admin_user, get_current_user, get_jwt_strategy
+from src.auth.tokens import auth_cache_stats
+from src.auth.passwords import password_hasher
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from scalar_fastapi import get_scalar_api_reference
 from fastapi.staticfiles import StaticFiles
 
 from src.i18n import LanguageMiddleware
 from src.pages.router import router_main as pages_router
 from src.pages.router import router_login as login_router
+from src.chat_history import router_chat as chat_router
 from src.gradio_ui import create_chat_ui, create_setting_ui
 from src.auth.models import User
+from src.model import registry, models_status, tts_cache_stats, text_to_wav_stream
+from src.llm_client import llm_pool
+from src.connections import manager
+from src.chat_store import chat_store, chat_session_id
+from src.context import new_context, token_counter
+from src.user_settings import settings_service, SettingsConflict
 
-from src.logger import CustomLogger
+from src.logger import CustomLogger, request_id_var, session_id_var
 LOGGER = CustomLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     LOGGER.info("Starting up: Connecting to DB...")
     await fetch_roles()
-    from src.config import prod_settings as settings
+    from src.config import prod_settings as settings, model_settings
     login(settings.HF_TOKEN)
+    await manager.start()
+    await chat_store.start()
+    warmup_task = None
+    if model_settings.INFERENCE_MODE != "worker":
+        LOGGER.info("Warming up models in background: %s", model_settings.WARMUP_MODELS)
+        warmup_task = asyncio.create_task(registry.warmup(
+            model_settings.WARMUP_MODELS, model_settings.WARMUP_RETRIES, model_settings.WARMUP_BACKOFF_S
+        ))
 
     yield
+    if warmup_task is not None:
+        warmup_task.cancel()
+    await llm_pool.close()
+    await manager.close()
+    await chat_store.close()
+    password_hasher.close()
     # LOGGER.info("Shutting down: Closing DB connections...")
     # await async_engine.dispose()
     
@@ -66,6 +88,7 @@ async def scalar_html():
 app.mount("/static", StaticFiles(directory="src/static"), name="static")
 app.include_router(pages_router)
 app.include_router(login_router)
+app.include_router(chat_router)
 
 app.include_router(
     fastapi_users.get_auth_router(auth_backend),
@@ -109,15 +132,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "OPTIONS", "DELETE", "PATCH", "PUT"],
     allow_headers=["Content-Type", "Set-Cookie", "Access-Control-Allow-Headers", "Access-Control-Allow-Origin",
-                   "Authorization"],
+                   "Authorization", "If-Match", "If-None-Match"],
+    expose_headers=["ETag"],
 )
 
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
+    request_id_var.set(request.headers.get("X-Request-ID") or uuid.uuid4().hex)
     start_time = time.time()
     response = await call_next(request)
     process_time = time.time() - start_time
     response.headers["X-Process-Time"] = str(process_time)
+    response.headers["X-Request-ID"] = request_id_var.get()
     return response
 
 app.add_middleware(LanguageMiddleware)
@@ -125,113 +151,170 @@ app.add_middleware(LanguageMiddleware)
 app = mount_gradio_app(app, create_chat_ui(), path='/chat', show_error=True, max_file_size="50mb", show_api=False, auth_dependency=get_current_user)
 app = mount_gradio_app(app, create_setting_ui(), path='/settings', show_error=True, max_file_size="3mb", show_api=False, auth_dependency=get_current_user)
 
+def __settings_response__(settings: dict, etag: str) -> JSONResponse:
+    return JSONResponse(content=settings, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
 @app.get("/api/v1/user/settings", tags=["settings"])
-async def get_user_settings(user: User = Depends(current_active_user),  db: AsyncSession = Depends(get_async_session)):
-    settings = await db.execute(
-        select(UserSettings).where(UserSettings.id == user.user_settings)
-    )
-    user_settings = settings.scalars().first()
-    LOGGER.info("User settings (get /api/v1/user/settings) %s of %s user", user_settings, user.id)
-    return user_settings.settings if user_settings else {}
+async def get_user_settings(user: User = Depends(current_active_user),
+                            if_none_match: str | None = Header(default=None)):
+    settings, etag = await settings_service.get(user.id)
+    if if_none_match is not None and etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers={"ETag": etag})
+    LOGGER.debug("User settings (get /api/v1/user/settings) of %s user", user.id)
+    return __settings_response__(settings, etag)
 
 @app.put("/api/v1/user/settings", tags=["settings"])
 async def update_user_settings(new_settings: dict,
                                user: User = Depends(current_active_user),
-                               db: AsyncSession = Depends(get_async_session)):
-    LOGGER.debug("Updating settings for user %s", user.id)
-    settings = await db.execute(
-        select(UserSettings).where(UserSettings.id == user.user_settings)
+                               if_match: str | None = Header(default=None)):
+    try:
+        settings, etag = await settings_service.put(user.id, new_settings, if_match)
+    except SettingsConflict:
+        raise HTTPException(status_code=412, detail="Settings were changed by another request")
+    LOGGER.info("User settings (put /api/v1/user/settings) of %s user", user.id)
+    return __settings_response__(settings, etag)
+
+@app.patch("/api/v1/user/settings", tags=["settings"])
+async def patch_user_settings(changes: dict,
+                              user: User = Depends(current_active_user),
+                              if_match: str | None = Header(default=None)):
+    """Merge `changes` into the stored settings; a `null` value removes the key."""
+    try:
+        settings, etag = await settings_service.patch(user.id, changes, if_match)
+    except SettingsConflict:
+        raise HTTPException(status_code=412, detail="Settings were changed by another request")
+    LOGGER.info("User settings (patch /api/v1/user/settings) of %s user", user.id)
+    return __settings_response__(settings, etag)
+
+class SpeechRequest(BaseModel):
+    text: str = Field(min_length=1, max_length=5000)
+    voice: int | None = Field(default=None, ge=0, description="Speaker id; defaults to the `voice` in the user's settings")
+
+@app.post("/api/v1/tts", tags=["speech"], response_class=StreamingResponse)
+async def text_to_speech(payload: SpeechRequest, user: User = Depends(current_active_user)):
+    """Synthesize `text` sentence by sentence into one streamed 16 kHz WAV, in the user's voice."""
+    LOGGER.info("Speech requested by user %s", user.id, extra={"fields": {"chars": len(payload.text)}})
+    return StreamingResponse(text_to_wav_stream(payload.text, payload.voice, user.id), media_type="audio/wav")
+
+@app.get("/api/v1/metrics/db", tags=["metrics"], dependencies=[Depends(current_admin_user)])
+async def database_metrics():
+    return database_stats()
+
+@app.get("/api/v1/metrics/auth-cache", tags=["metrics"], dependencies=[Depends(current_admin_user)])
+async def auth_cache_metrics():
+    return auth_cache_stats()
+
+@app.get("/api/v1/metrics/user-settings", tags=["metrics"], dependencies=[Depends(current_admin_user)])
+async def user_settings_metrics():
+    return settings_service.stats()
+
+@app.get("/health/live", tags=["health"])
+async def liveness():
+    return {"status": "alive"}
+
+@app.get("/health/ready", tags=["health"])
+async def readiness():
+    """Report 200 only once every warm-up model is loaded, so the load balancer skips cold workers."""
+    ready, status = await models_status()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "models": status},
     )
-    user_settings = settings.scalars().first()
-    if user_settings:
-        user_settings.settings = new_settings
-        LOGGER.info("Existing user settings found for user %s", user.id)
-    else:
-        user_settings = UserSettings(id=user.user_settings, settings=new_settings)
-        db.add(user_settings)
-        await db.flush()
-        LOGGER.warning("User settings not found for user %s, creating new settings", user.id)
-    await db.commit()
-    await db.refresh(user_settings)
-    LOGGER.info("User settings (put /api/v1/user/settings) %s of %s user", user_settings, user.id)
-    return user_settings.settings
 
-@app.get("/api/v1/protected-route")
-async def protected_route(user: User = Depends(current_active_user)):
-    return {"message": "Authenticated", "user": user.username}
+@app.get("/api/v1/metrics/tts-cache", tags=["metrics"], dependencies=[Depends(current_admin_user)])
+async def tts_cache_metrics():
+    return await tts_cache_stats()
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict[int, WebSocket] = {}
+@app.get("/api/v1/metrics/llm-pool", tags=["metrics"], dependencies=[Depends(current_admin_user)])
+async def llm_pool_metrics():
+    return llm_pool.stats()
 
-    async def connect(self, websocket: WebSocket, user_id: int):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
+@app.get("/api/v1/metrics/chat-store", tags=["metrics"], dependencies=[Depends(current_admin_user)])
+async def chat_store_metrics():
+    return chat_store.stats()
 
-    def disconnect(self, user_id: int):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
+@app.get("/api/v1/metrics/context", tags=["metrics"], dependencies=[Depends(current_admin_user)])
+async def context_metrics():
+    return token_counter.stats()
 
-    @staticmethod
-    async def send_personal_message(websocket: WebSocket, message: dict):
-        """Stream AI model response to the client WebSocket in real time."""
-    
-        uri = "ws://localhost:2222/stream"
-        try:
-            async with websockets.connect(uri) as llm_ws:
-                await llm_ws.send(json.dumps({"text": message}))
-                LOGGER.debug("Message sent to LLM WebSocket: %s", message)
-                async for token in llm_ws:
-                    LOGGER.debug("Token received from LLM WebSocket: %s", token)
-                    parsed_token = json.loads(token) if isinstance(token, str) else token
-                    await websocket.send_json({"response": parsed_token})
-    
-        except Exception as e:
-            await websocket.send_json({"Error": str(e)})
+@app.post("/api/v1/admin/users/bulk", tags=["admin"], response_model=BulkUserCreateResult)
+async def provision_users(payload: BulkUserCreate,
+                          admin: User = Depends(current_admin_user),
+                          user_manager = Depends(get_user_manager)):
+    """Create many users in one call; existing and invalid entries are reported, not created."""
+    from src.config import prod_settings as settings
+    LOGGER.info("Admin %s provisions %d users", admin.id, len(payload.users))
+    return await user_manager.create_many(payload.users, batch_size=settings.PROVISION_BATCH_SIZE)
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections.values():
-            await connection.send_text(message)
+@app.get("/api/v1/protected-route")
+async def protected_route(user: User = Depends(current_active_user)):
+    return {"message": "Authenticated", "user": user.username}
 
-manager = ConnectionManager()
+@app.get("/api/v1/metrics/connections", tags=["metrics"], dependencies=[Depends(current_admin_user)])
+async def connection_metrics():
+    return manager.stats()
 
 @app.websocket("/ws_sendMessages")
 async def websocket_endpoint(websocket: WebSocket, db = Depends(get_user_manager)):
+    """
+    Chat over WebSocket.
+
+    Frames `{"type": "subscribe" | "unsubscribe", "room": ...}` manage room
+    subscriptions. Any other frame is a chat message: the reply is streamed
+    back to this socket, and when the frame names a `room` it is also
+    announced to that room's subscribers.
+
+    The exchange is stored under the chat session named by the `session`
+    query parameter, or a fresh session per socket when it is absent.
+    """
+    request_id_var.set(websocket.headers.get("X-Request-ID") or uuid.uuid4().hex)
     user = await get_user_from_ws(websocket, db)
     if user is None:
         await websocket.close(code=1008)
         LOGGER.warning("Unauthorized WebSocket connection")
         return None
+    connection = None
     try:
-        await manager.connect(websocket, user.id)
+        connection = await manager.connect(websocket, user.id)
+        session_id = chat_session_id(user.id, websocket.query_params.get("session") or str(uuid.uuid4()))
+        session_id_var.set(str(session_id))
+        context = new_context()
         while True:
             data = await websocket.receive_json()
 
-            await manager.send_personal_message(websocket, data["content"])
+            if data.get("type") == "subscribe":
+                manager.join(connection, data["room"])
+                continue
+            if data.get("type") == "unsubscribe":
+                manager.leave(connection, data["room"])
+                continue
+
+            await manager.send_personal_message(connection, data["content"], session_id, context)
 
-            await manager.broadcast(f"Client #{user.id} says: {data}")
-            LOGGER.info("Client #%s says: %s", user.id, data)
+            if data.get("room"):
+                manager.publish(data["room"], f"Client #{user.id} says: {data}")
+            LOGGER.debug("Client #%s sent a message", user.id, extra={"fields": {"chars": len(data["content"])}})
     except WebSocketDisconnect:
-        manager.disconnect(user.id)
-        await manager.broadcast(f"Client #{user.id} left the chat")
         LOGGER.info("Client #%s left the chat", user.id)
     except Exception as e:
         LOGGER.error("Error during websocket connection: %s", e)
         return {"error": str(e)}
+    finally:
+        if connection is not None:
+            for room in manager.disconnect(connection):
+                manager.publish(room, f"Client #{user.id} left the chat")
 
 async def get_user_from_ws(websocket: WebSocket, user_db):
     token = websocket.cookies.get("bonds")
-    LOGGER.debug("Token from WebSocket: %s", token)
     if token:
         try:
             payload = await get_jwt_strategy().read_token(token, user_db)
-            LOGGER.info("Payload from WebSocket: %s", payload)
             if isinstance(payload, User):
                 user = payload
             else:
                 user = await user_db.get(payload["sub"])
             if user:
-                LOGGER.info("User from WebSocket: %s", user)
+                LOGGER.info("User %s connected over WebSocket", user.id)
                 return user
         except Exception as e:
             LOGGER.error(f"Error authenticating user: {e}")
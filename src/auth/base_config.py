@@ -1,11 +1,11 @@
-from fastapi import Depends,Request
+from fastapi import Depends, Request, HTTPException
 from fastapi_users import FastAPIUsers
 from fastapi_users.authentication import CookieTransport, AuthenticationBackend
-from fastapi_users.authentication import JWTStrategy
 from pydantic import UUID4
 from src.auth.manager import get_user_manager
 from src.auth.models import User
-from src.config import prod_settings as settings
+from src.auth.tokens import get_jwt_strategy
+from src.database import get_roles
 import asyncio
 
 
@@ -13,9 +13,6 @@ cookie_transport = CookieTransport(cookie_name="bonds",
                                    cookie_max_age=36000, # 10 hours
                                    cookie_secure=False)
 
-def get_jwt_strategy() -> JWTStrategy:
-    return JWTStrategy(secret=settings.SECRET_AUTH, lifetime_seconds=36000) # 10 hours
-
 auth_backend = AuthenticationBackend(
     name="jwt",
     transport=cookie_transport,
@@ -28,6 +25,12 @@ fastapi_users = FastAPIUsers[User, UUID4](
 )
 current_active_user = fastapi_users.current_user(active=True)
 
+async def current_admin_user(user: User = Depends(current_active_user)):
+    roles = await get_roles()
+    if str(user.role_id) != roles.get("admin"):
+        raise HTTPException(status_code=403, detail="Admin role required")
+    return user
+
 async def get_current_user_async(user=Depends(current_active_user)):
     return user
 
@@ -0,0 +1,106 @@
+import time
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from src.logger import CustomLogger
+LOGGER = CustomLogger(__name__)
+
+class TokenCache:
+    """
+    Verified JWTs, each remembered until the token itself expires.
+
+    Maps a token digest to the user id in its `sub` claim, so a token is
+    only decoded and its signature checked on first sight. Invalid tokens
+    are never cached.
+
+    Args:
+        max_entries (int): Number of tokens kept; least recently used go first.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._tokens: OrderedDict[bytes, tuple[float, uuid.UUID]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def verify(self, token: str, decode: Callable[[str], dict]) -> uuid.UUID | None:
+        key = hashlib.sha256(token.encode()).digest()
+        now = time.time()
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry is not None and entry[0] > now:
+                self._tokens.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        payload = decode(token)
+        if payload is None:
+            return None
+        user_id = uuid.UUID(payload["sub"])
+        with self._lock:
+            self._tokens[key] = (payload.get("exp", now), user_id)
+            if len(self._tokens) > self.max_entries:
+                self._tokens.popitem(last=False)
+        return user_id
+
+    def stats(self) -> dict[str, int]:
+        return {"entries": len(self._tokens), "hits": self.hits, "misses": self.misses}
+
+class UserCache:
+    """
+    Short-lived copies of user rows for authentication.
+
+    Every hit returns a fresh detached copy, so requests never share an
+    instance and each one can attach its copy to its own session for
+    updates. Entries are dropped on `invalidate` (called by the user
+    manager after updates and deletes) and otherwise expire after `ttl`,
+    which bounds how stale other workers can be.
+
+    Args:
+        ttl (float): Seconds a user row is served from memory.
+        max_entries (int): Number of users kept.
+    """
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._users: OrderedDict[uuid.UUID, tuple[float, type, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: uuid.UUID):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None or entry[0] <= time.monotonic():
+                self.misses += 1
+                return None
+            self._users.move_to_end(user_id)
+            self.hits += 1
+        _, cls, values = entry
+        user = cls(**values)
+        make_transient_to_detached(user)
+        return user
+
+    def put(self, user):
+        mapper = inspect(user).mapper
+        values = {attr.key: getattr(user, attr.key) for attr in mapper.column_attrs}
+        with self._lock:
+            self._users[user.id] = (time.monotonic() + self.ttl, mapper.class_, values)
+            self._users.move_to_end(user.id)
+            if len(self._users) > self.max_entries:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id: uuid.UUID):
+        with self._lock:
+            self._users.pop(user_id, None)
+        LOGGER.debug("User %s dropped from the auth cache", user_id)
+
+    def stats(self) -> dict[str, int]:
+        return {"entries": len(self._users), "hits": self.hits, "misses": self.misses}
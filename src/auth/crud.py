@@ -8,5 +8,5 @@ from src.logger import CustomLogger
 LOGGER = CustomLogger(__name__)
 
 async def get_user_db(session: AsyncSession = Depends(get_async_session)):
-    LOGGER.info("Getting user database.", extra={"session": session})
+    LOGGER.debug("Getting user database.", extra={"sample": True})
     yield SQLAlchemyUserDatabase(session, User)
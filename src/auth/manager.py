@@ -4,13 +4,18 @@ from typing import Optional, Dict, Any, Union
 from fastapi import Depends, Request, Response
 from fastapi_users import BaseUserManager, UUIDIDMixin, exceptions, models, schemas, InvalidPasswordException
 from pydantic import UUID4
+from sqlalchemy import select, or_, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.auth.schemas import UserCreate
 from src.config import prod_settings as settings
 from src.auth.models import User, UserSettings
 from src.auth.crud import get_user_db
-from src.database import get_async_session, get_roles
+from src.auth.tokens import user_cache
+from src.auth.passwords import password_hasher
+from src.user_settings import settings_service
+from src.database import get_roles
 from src.gradio_ui import load_default_preset
 
 from src.logger import CustomLogger
@@ -42,30 +47,139 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, UUID4]):
             else user_create.create_update_dict_superuser()
         )
         password = user_dict.pop("password")
-        user_dict["hashed_password"] = self.password_helper.hash(password)
+        user_dict["hashed_password"] = await password_hasher.hash(password)
         roles = await get_roles()
         user_dict["role_id"] = roles["user"] # Default role for new users
-        async for session in get_async_session():
-            user_dict["user_settings"] = uuid.UUID(await create_user_settings(session))
-            
+        # Flushed in the user's session ahead of the user row it is referenced by, and committed together
+        # with it by user_db.create; no relationship() links the models, so the flush order is ours to set
+        user_dict["user_settings"] = await add_user_settings(self.user_db.session)
+
         created_user = await self.user_db.create(user_dict)
         
         await self.on_after_register(created_user, request)
         LOGGER.info(f"User {created_user.username} has been created.")
         return created_user
 
+    async def create_many(self, user_creates: list[UserCreate], batch_size: int = 500) -> Dict[str, Any]:
+        """
+        Provision many users at once.
+
+        Existing e-mails and usernames are found with one query, passwords
+        are hashed in parallel in the password pool, and users with their
+        settings are inserted in multi-row batches of `batch_size`, one
+        transaction per batch. A batch that collides with users created
+        meanwhile is retried row by row, and the colliding users are
+        reported as existing.
+        """
+        invalid: Dict[str, str] = {}
+        candidates: list[UserCreate] = []
+        seen_emails, seen_usernames = set(), set()
+        for user_create in user_creates:
+            if user_create.email in seen_emails or user_create.username in seen_usernames:
+                invalid[user_create.email] = "Duplicate e-mail or username in request"
+                continue
+            seen_emails.add(user_create.email)
+            seen_usernames.add(user_create.username)
+            try:
+                await self.validate_password(user_create.password, user_create)
+            except InvalidPasswordException as e:
+                invalid[user_create.email] = e.reason
+                continue
+            candidates.append(user_create)
+
+        session = self.user_db.session
+        taken_emails, taken_usernames = set(), set()
+        if candidates:
+            rows = await session.execute(
+                select(User.email, User.username).where(or_(
+                    User.email.in_([u.email for u in candidates]),
+                    User.username.in_([u.username for u in candidates]),
+                ))
+            )
+            for email, username in rows.all():
+                taken_emails.add(email)
+                taken_usernames.add(username)
+        existing = [u.email for u in candidates if u.email in taken_emails or u.username in taken_usernames]
+        candidates = [u for u in candidates if u.email not in taken_emails and u.username not in taken_usernames]
+
+        hashed_passwords = await password_hasher.hash_many([u.password for u in candidates])
+        role_id = (await get_roles())["user"]
+        created: list[uuid.UUID] = []
+        for start in range(0, len(candidates), batch_size):
+            settings_rows, user_rows = [], []
+            for user_create, hashed_password in zip(candidates[start:start + batch_size],
+                                                    hashed_passwords[start:start + batch_size]):
+                settings_id, user_id = uuid.uuid4(), uuid.uuid4()
+                settings_rows.append({"id": settings_id, "settings": load_default_preset(), "updated_at": datetime.now()})
+                user_rows.append({
+                    "id": user_id,
+                    "username": user_create.username,
+                    "email": user_create.email,
+                    "hashed_password": hashed_password,
+                    "role_id": role_id,
+                    "is_active": user_create.is_active,
+                    "is_verified": user_create.is_verified,
+                    "user_settings": settings_id,
+                })
+            try:
+                await session.execute(insert(UserSettings), settings_rows)
+                await session.execute(insert(User), user_rows)
+                await session.commit()
+                created.extend(row["id"] for row in user_rows)
+            except IntegrityError:
+                await session.rollback()
+                LOGGER.warning(f"Batch of {len(user_rows)} users collided with existing users, inserting one by one.")
+                for settings_row, user_row in zip(settings_rows, user_rows):
+                    try:
+                        async with session.begin_nested():
+                            await session.execute(insert(UserSettings), [settings_row])
+                            await session.execute(insert(User), [user_row])
+                    except IntegrityError:
+                        existing.append(user_row["email"])
+                        continue
+                    created.append(user_row["id"])
+                await session.commit()
+            LOGGER.info(f"Provisioned {len(created)} users so far.")
+        return {"created": created, "existing": existing, "invalid": invalid}
+
+    async def authenticate(self, credentials) -> Optional[User]:
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # Hash anyway, so unknown e-mails take as long as wrong passwords
+            await password_hasher.hash(credentials.password)
+            return None
+
+        verified, updated_password_hash = await password_hasher.verify_and_update(
+            credentials.password, user.hashed_password
+        )
+        if not verified:
+            return None
+        if updated_password_hash is not None:
+            await self.user_db.update(user, {"hashed_password": updated_password_hash})
+            user_cache.invalidate(user.id)
+        return user
+
+    async def _update(self, user: User, update_dict: Dict[str, Any]) -> User:
+        password = update_dict.get("password")
+        if password is not None:
+            await self.validate_password(password, user)
+            update_dict = {key: value for key, value in update_dict.items() if key != "password"}
+            update_dict["hashed_password"] = await password_hasher.hash(password)
+        return await super()._update(user, update_dict)
+
     async def validate_password(
             self,
             password: str,
             user: Union[UserCreate, User],
     ) -> None:
         if len(password) < 8:
-            LOGGER.warning(f"User {user.id} password should be at least 8 characters")
+            LOGGER.warning(f"User {user.email} password should be at least 8 characters")
             raise InvalidPasswordException(
                 reason="Password should be at least 8 characters"
             )
         if user.email in password:
-            LOGGER.warning(f"User {user.id} password should not contain e-mail")
+            LOGGER.warning(f"User {user.email} password should not contain e-mail")
             raise InvalidPasswordException(
                 reason="Password should not contain e-mail"
             )
@@ -85,6 +199,7 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, UUID4]):
     async def on_after_verify(
             self, user: User, request: Optional[Request] = None
     ):
+        user_cache.invalidate(user.id)
         LOGGER.info(f"User {user.id} has been verified")
         print(f"User {user.id} has been verified")
     async def on_after_login(
@@ -101,6 +216,8 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, UUID4]):
         print(f"User {user.id} is going to be deleted")
 
     async def on_after_delete(self, user: User, request: Optional[Request] = None):
+        user_cache.invalidate(user.id)
+        settings_service.invalidate(user.id)
         LOGGER.info(f"User {user.id} is successfully deleted")
         print(f"User {user.id} is successfully deleted")
 
@@ -110,22 +227,21 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, UUID4]):
             update_dict: Dict[str, Any],
             request: Optional[Request] = None,
     ):
+        user_cache.invalidate(user.id)
         LOGGER.info(f"User {user.id} has been updated with {update_dict}.")
         print(f"User {user.id} has been updated with {update_dict}.")
 
 async def get_user_manager(user_db=Depends(get_user_db)):
-    yield UserManager(user_db)
+    yield UserManager(user_db, password_hasher.helper)
 
-async def create_user_settings(session: AsyncSession):
+async def add_user_settings(session: AsyncSession) -> uuid.UUID:
     new_settings = UserSettings(
         id=uuid.uuid4(),                      
         settings=load_default_preset(),
         updated_at=datetime.now()      
     )
 
-    session.add(new_settings)            
-    await session.commit()                     
-    await session.refresh(new_settings)
+    session.add(new_settings)
+    await session.flush()
     LOGGER.info(f"New settings created with ID: {new_settings.id}")
-    print(f"New settings created with ID: {new_settings.id}")
-    return str(new_settings.id)
\ No newline at end of file
+    return new_settings.id
@@ -2,7 +2,7 @@ from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from sqlalchemy.orm import relationship
 from src.database import Base
-from sqlalchemy import Column, String, ForeignKey, JSON, DateTime, Text, func, Boolean
+from sqlalchemy import Column, String, ForeignKey, JSON, DateTime, Text, func, Boolean, Index
 from src.gradio_ui import load_default_preset
 
 class User(Base):
@@ -35,8 +35,13 @@ class ChatSession(Base):
     agent_id = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
-    # Relationship to fetch associated messages
-    messages = relationship("ChatMessage", back_populates="session")
+    # Relationship to fetch associated messages; never load it whole, page through chat_history instead
+    messages = relationship("ChatMessage", back_populates="session", lazy="raise")
+
+    __table_args__ = (
+        # Covers the keyset listing of a user's sessions, so it is answered by an index-only scan
+        Index("ix_chat_sessions_user_created_id", "user_id", "created_at", "id", postgresql_include=["agent_id"]),
+    )
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
@@ -46,10 +51,15 @@ class ChatMessage(Base):
     role_model = Column(String, nullable=False)  # e.g., "user" or "assistant"
     content = Column(Text, nullable=False)
     message_metadata = Column(JSON, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     session = relationship("ChatSession", back_populates="messages")
 
+    __table_args__ = (
+        # Keyset pagination of a session's messages in (created_at, id) order
+        Index("ix_chat_messages_session_created_id", "session_id", "created_at", "id"),
+    )
+
 class UserSettings(Base):
     __tablename__ = "user_settings"
 
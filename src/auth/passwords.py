@@ -0,0 +1,64 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from fastapi_users.password import PasswordHelper
+
+from src.config import prod_settings as settings
+
+from src.logger import CustomLogger
+LOGGER = CustomLogger(__name__)
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification off the event loop.
+
+    Argon2 and bcrypt are deliberately slow and release the GIL while they
+    work, so a small thread pool runs them in parallel while the loop keeps
+    serving streams. The semaphore keeps at most `workers` jobs in the pool;
+    further callers wait their turn on the loop, in arrival order.
+
+    Bulk hashing (`hash_many`) first passes a gate of `bulk_workers` slots,
+    so at most that many bulk jobs ever wait for or hold a pool slot. A
+    login arriving during a large import queues behind a few hashes, not
+    behind the whole import, and keeps at least `workers - bulk_workers`
+    threads to itself.
+
+    Args:
+        helper (PasswordHelper): The hashing backend of fastapi-users.
+        workers (int): Number of threads, and of hashes running at once.
+        bulk_workers (int): Hashes of bulk jobs running or waiting at once.
+    """
+
+    def __init__(self, helper: PasswordHelper, workers: int = 4, bulk_workers: int | None = None):
+        self.helper = helper
+        self.workers = workers
+        self.bulk_workers = max(1, min(workers - 1, bulk_workers or workers // 2))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = asyncio.Semaphore(workers)
+        self._bulk_slots = asyncio.Semaphore(self.bulk_workers)
+
+    async def __run__(self, fn, *args):
+        async with self._slots:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def hash(self, password: str) -> str:
+        return await self.__run__(self.helper.hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        return await self.__run__(self.helper.verify_and_update, plain_password, hashed_password)
+
+    async def __hash_bulk__(self, password: str) -> str:
+        async with self._bulk_slots:
+            return await self.hash(password)
+
+    async def hash_many(self, passwords: list[str]) -> list[str]:
+        return await asyncio.gather(*(self.__hash_bulk__(password) for password in passwords))
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(
+    PasswordHelper(),
+    workers=settings.PASSWORD_HASH_WORKERS,
+    bulk_workers=settings.PASSWORD_HASH_BULK_WORKERS,
+)
@@ -1,6 +1,6 @@
 import uuid
 from fastapi_users import schemas
-from pydantic import UUID4, EmailStr
+from pydantic import UUID4, EmailStr, BaseModel, Field
 
 class UserRead(schemas.BaseUser[UUID4]):
     id: UUID4
@@ -27,4 +27,12 @@ class UserUpdate(schemas.BaseUserUpdate):
     username: str
     role_id: UUID4
     is_active: bool
-    is_verified: bool
\ No newline at end of file
+    is_verified: bool
+
+class BulkUserCreate(BaseModel):
+    users: list[UserCreate] = Field(min_length=1, max_length=10000)
+
+class BulkUserCreateResult(BaseModel):
+    created: list[UUID4]
+    existing: list[EmailStr]
+    invalid: dict[str, str]
\ No newline at end of file
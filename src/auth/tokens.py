@@ -0,0 +1,58 @@
+import uuid
+import jwt
+from fastapi_users import exceptions
+from fastapi_users.authentication import JWTStrategy
+from fastapi_users.jwt import decode_jwt
+from src.auth.cache import TokenCache, UserCache
+from src.config import prod_settings as settings
+
+token_cache = TokenCache(max_entries=settings.AUTH_TOKEN_CACHE_SIZE)
+user_cache = UserCache(ttl=settings.AUTH_USER_CACHE_TTL_S, max_entries=settings.AUTH_USER_CACHE_SIZE)
+
+class CachedJWTStrategy(JWTStrategy):
+    """
+    JWT strategy that verifies each token once and serves users from `user_cache`.
+
+    A burst of reconnects after a deploy then costs one signature check per
+    token and at most one user query per `AUTH_USER_CACHE_TTL_S`, instead
+    of both on every request and WebSocket handshake.
+    """
+
+    def __decode__(self, token: str) -> dict | None:
+        try:
+            payload = decode_jwt(token, self.decode_key, self.token_audience, algorithms=[self.algorithm])
+        except jwt.PyJWTError:
+            return None
+        return payload if "sub" in payload else None
+
+    def verify(self, token: str | None) -> uuid.UUID | None:
+        if not token:
+            return None
+        try:
+            return token_cache.verify(token, self.__decode__)
+        except ValueError:
+            return None
+
+    async def read_token(self, token, user_manager):
+        user_id = self.verify(token)
+        if user_id is None:
+            return None
+        user = user_cache.get(user_id)
+        if user is not None:
+            return user
+        try:
+            user = await user_manager.get(user_id)
+        except (exceptions.UserNotExists, exceptions.InvalidID):
+            return None
+        user_cache.put(user)
+        return user
+
+def get_jwt_strategy() -> JWTStrategy:
+    return CachedJWTStrategy(secret=settings.SECRET_AUTH, lifetime_seconds=36000) # 10 hours
+
+def user_id_from_token(token: str | None) -> uuid.UUID | None:
+    """Return the user id of a valid `bonds` JWT without touching the database."""
+    return get_jwt_strategy().verify(token)
+
+def auth_cache_stats() -> dict:
+    return {"tokens": token_cache.stats(), "users": user_cache.stats()}
@@ -0,0 +1,131 @@
+import uuid
+import asyncio
+from contextlib import aclosing
+from typing import AsyncIterator
+
+from src.config import chat_settings
+from src.llm_client import llm_pool
+from src.chat_store import chat_store
+from src.context import ConversationContext
+
+from src.logger import CustomLogger
+LOGGER = CustomLogger(__name__)
+
+END_OF_STREAM = {"end_of_stream": True}
+
+async def stream_reply(message: str, user_id: uuid.UUID | None = None,
+                       session_id: uuid.UUID | None = None, agent_id: str = "chat",
+                       context: ConversationContext | None = None) -> AsyncIterator[str]:
+    """
+    Stream the assistant reply to `message` token by token.
+
+    Shared by the `/ws_sendMessages` endpoint and the mounted Gradio UI,
+    which calls it in-process instead of looping back through the
+    WebSocket (and its second authentication and JSON round-trip).
+    The upstream end-of-stream marker is consumed here, not yielded.
+
+    With `user_id` and `session_id` the exchange is recorded in the chat
+    history: the prompt up front, and the assembled reply once the stream
+    ends. Both go through the write-behind `chat_store`, so nothing here
+    waits on the database, per token or otherwise.
+
+    With a `context`, its earlier turns are sent along as `history`, and
+    the prompt and the reply are appended to it.
+    """
+    persist = user_id is not None and session_id is not None
+    if persist:
+        chat_store.open_session(session_id, user_id, agent_id)
+        chat_store.add_message(session_id, "user", message)
+    payload = {"text": message}
+    if context is not None:
+        # Appended first, so the prompt counts against the budget the history is cut to
+        context.append("user", message)
+        payload["history"] = context.messages()[:-1]
+    parts: list[str] = []
+    complete = False
+    try:
+        async with aclosing(llm_pool.stream(payload)) as tokens:
+            async for token in tokens:
+                if isinstance(token, dict):
+                    if token.get("end_of_stream"):
+                        complete = True
+                        break
+                    if "error" in token:
+                        raise RuntimeError(f"LLM stream failed: {token['error']}")
+                    LOGGER.warning("Ignoring non-text token from LLM: %s", token, extra={"rate_key": "llm-non-text-token"})
+                    continue
+                parts.append(token)
+                yield token
+    finally:
+        if parts:
+            reply = "".join(parts)
+            if context is not None:
+                context.append("assistant", reply)
+            if persist:
+                chat_store.add_message(session_id, "assistant", reply,
+                                       None if complete else {"incomplete": True})
+
+async def coalesce(tokens: AsyncIterator[str], interval_ms: float | None = None,
+                   max_bytes: int | None = None) -> AsyncIterator[str]:
+    """
+    Merge a token stream into deltas flushed on a time or size window.
+
+    The first token is passed through immediately to keep time-to-first-token
+    low. After that, tokens are buffered until `interval_ms` has passed since
+    the first buffered token or `max_bytes` of UTF-8 text has accumulated,
+    whichever comes first. An interval of 0 disables coalescing.
+    """
+    interval = (chat_settings.CHAT_FLUSH_INTERVAL_MS if interval_ms is None else interval_ms) / 1000
+    max_bytes = chat_settings.CHAT_FLUSH_BYTES if max_bytes is None else max_bytes
+    if interval <= 0:
+        async for token in tokens:
+            yield token
+        return
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async with aclosing(tokens) as source:
+                async for token in source:
+                    queue.put_nowait(token)
+            queue.put_nowait(done)
+        except Exception as e:
+            queue.put_nowait(e)
+
+    pump_task = asyncio.create_task(pump())
+    buffer: list[str] = []
+    size = 0
+    deadline = None
+    first = True
+    try:
+        while True:
+            try:
+                timeout = None if deadline is None else max(0.0, deadline - loop.time())
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                item = None
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if item is not None:
+                if first:
+                    first = False
+                    yield item
+                    continue
+                if not buffer:
+                    deadline = loop.time() + interval
+                buffer.append(item)
+                size += len(item.encode())
+            if buffer and (item is None or size >= max_bytes or loop.time() >= deadline):
+                yield "".join(buffer)
+                buffer.clear()
+                size = 0
+                deadline = None
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        pump_task.cancel()
@@ -0,0 +1,123 @@
+import json
+import uuid
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, Literal
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, UUID4
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.base_config import current_active_user
+from src.auth.models import User, ChatSession, ChatMessage
+from src.database import get_async_session
+
+from src.logger import CustomLogger
+LOGGER = CustomLogger(__name__)
+
+MAX_PAGE_SIZE = 200
+
+class ChatSessionRead(BaseModel):
+    id: uuid.UUID  # uuid5 from `chat_session_id`, not a random uuid4
+    agent_id: str
+    created_at: datetime
+
+class ChatMessageRead(BaseModel):
+    id: UUID4
+    role_model: str
+    content: str
+    message_metadata: dict[str, Any] | None = None
+    created_at: datetime
+
+class ChatSessionPage(BaseModel):
+    items: list[ChatSessionRead]
+    next_cursor: str | None = None
+
+class ChatMessagePage(BaseModel):
+    items: list[ChatMessageRead]
+    next_cursor: str | None = None
+
+
+def encode_cursor(created_at: datetime, id_: uuid.UUID) -> str:
+    raw = json.dumps([created_at.isoformat(), str(id_)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id_ = json.loads(raw)
+        return datetime.fromisoformat(created_at), uuid.UUID(id_)
+    except (binascii.Error, ValueError, TypeError) as e:
+        LOGGER.warning("Rejected malformed cursor %s: %s", cursor, e)
+        raise HTTPException(status_code=400, detail="Malformed cursor")
+
+def __keyset__(query, created_at_col, id_col, cursor: str | None, order: str, limit: int):
+    """
+    Page `query` by the (created_at, id) keyset instead of OFFSET.
+
+    The row comparison continues right after the cursor row, so every page
+    is a range scan of the composite index however deep the client pages.
+    One extra row is fetched to tell whether another page exists.
+    """
+    if cursor is not None:
+        key = tuple_(created_at_col, id_col)
+        after = decode_cursor(cursor)
+        query = query.where(key < after if order == "desc" else key > after)
+    if order == "desc":
+        query = query.order_by(created_at_col.desc(), id_col.desc())
+    else:
+        query = query.order_by(created_at_col.asc(), id_col.asc())
+    return query.limit(limit + 1)
+
+def __page__(rows, limit: int) -> tuple[list, str | None]:
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+
+router_chat = APIRouter(
+    prefix="/api/v1/chat",
+    tags=["chat"]
+)
+
+@router_chat.get("/sessions", response_model=ChatSessionPage)
+async def list_sessions(cursor: str | None = None,
+                        limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+                        user: User = Depends(current_active_user),
+                        db: AsyncSession = Depends(get_async_session)):
+    """List the user's chat sessions, newest first."""
+    query = __keyset__(
+        select(ChatSession.id, ChatSession.agent_id, ChatSession.created_at).where(ChatSession.user_id == user.id),
+        ChatSession.created_at, ChatSession.id, cursor, "desc", limit,
+    )
+    rows, next_cursor = __page__((await db.execute(query)).all(), limit)
+    LOGGER.debug("Listed %d chat sessions of user %s", len(rows), user.id)
+    return ChatSessionPage(items=[ChatSessionRead.model_validate(row._asdict()) for row in rows], next_cursor=next_cursor)
+
+@router_chat.get("/sessions/{session_id}/messages", response_model=ChatMessagePage)
+async def list_messages(session_id: uuid.UUID,
+                        cursor: str | None = None,
+                        limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+                        order: Literal["asc", "desc"] = "desc",
+                        user: User = Depends(current_active_user),
+                        db: AsyncSession = Depends(get_async_session)):
+    """
+    Page through a session's messages, newest first by default.
+
+    Pass the returned `next_cursor` back to fetch the following page;
+    `order=asc` replays the conversation from its start instead.
+    """
+    owner = await db.scalar(select(ChatSession.user_id).where(ChatSession.id == session_id))
+    if owner != user.id:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    query = __keyset__(
+        select(ChatMessage.id, ChatMessage.role_model, ChatMessage.content,
+               ChatMessage.message_metadata, ChatMessage.created_at).where(ChatMessage.session_id == session_id),
+        ChatMessage.created_at, ChatMessage.id, cursor, order, limit,
+    )
+    rows, next_cursor = __page__((await db.execute(query)).all(), limit)
+    LOGGER.debug("Fetched %d messages of chat session %s", len(rows), session_id)
+    return ChatMessagePage(items=[ChatMessageRead.model_validate(row._asdict()) for row in rows], next_cursor=next_cursor)
@@ -0,0 +1,220 @@
+import uuid
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from sqlalchemy import exc
+from sqlalchemy.dialects.postgresql import insert
+
+from src.config import chat_settings
+from src.database import async_session_maker
+
+from src.logger import CustomLogger
+LOGGER = CustomLogger(__name__)
+
+CHAT_SESSION_NAMESPACE = uuid.UUID("6f0c7c1e-2f4e-4a59-9d55-3c1f0f5b8a21")
+
+def chat_session_id(user_id: uuid.UUID, key: str) -> uuid.UUID:
+    """Stable chat session id for a client-side session key, scoped to its user."""
+    return uuid.uuid5(CHAT_SESSION_NAMESPACE, f"{user_id}:{key}")
+
+class ChatWriteBehind:
+    """
+    Write-behind buffer for chat sessions and messages.
+
+    Callers record sessions and complete messages without awaiting the
+    database. A background task writes everything buffered in one
+    transaction with bulk inserts every `flush_interval` seconds, or sooner
+    once `batch_size` messages are waiting. Flushes that fail on the
+    connection, on timeouts or on contention are retried with exponential
+    backoff (up to `MAX_BACKOFF_S`); beyond `max_buffer` pending messages
+    the oldest are dropped rather than growing memory without bound. Only
+    a batch failing on its data (SQLSTATE classes 22 and 23, e.g. a NUL
+    byte or a missing session) is bisected to drop the rows the database
+    keeps rejecting, so one bad row cannot hold back the rest. Inserts
+    skip ids already stored, which makes retrying a batch safe.
+
+    Args:
+        session_maker: Factory of `AsyncSession`s.
+        flush_interval (float): Seconds between flushes.
+        batch_size (int): Pending messages that trigger an early flush.
+        max_buffer (int): Upper bound on pending messages.
+    """
+
+    MAX_BACKOFF_S = 30.0
+
+    def __init__(self, session_maker, flush_interval: float = 1.0, batch_size: int = 200, max_buffer: int = 10000):
+        self.session_maker = session_maker
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self._sessions: list[dict[str, Any]] = []
+        self._messages: list[dict[str, Any]] = []
+        self._known_sessions: OrderedDict[uuid.UUID, None] = OrderedDict()
+        self._last_created_at = datetime.min.replace(tzinfo=timezone.utc)
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._backoff = 0.0
+        self._task: asyncio.Task | None = None
+        self.flushed = 0
+        self.dropped = 0
+
+    def open_session(self, session_id: uuid.UUID, user_id: uuid.UUID, agent_id: str):
+        if session_id in self._known_sessions:
+            self._known_sessions.move_to_end(session_id)
+            return
+        self._known_sessions[session_id] = None
+        if len(self._known_sessions) > self.max_buffer:
+            self._known_sessions.popitem(last=False)
+        self._sessions.append({
+            "id": session_id,
+            "user_id": user_id,
+            "agent_id": agent_id,
+            "created_at": self.__now__(),
+        })
+
+    def __now__(self) -> datetime:
+        # Strictly increasing, so (created_at, id) keeps insertion order within a bulk insert.
+        now = datetime.now(timezone.utc)
+        if now <= self._last_created_at:
+            now = self._last_created_at + timedelta(microseconds=1)
+        self._last_created_at = now
+        return now
+
+    def add_message(self, session_id: uuid.UUID, role: str, content: str, metadata: dict | None = None):
+        self._messages.append({
+            "id": uuid.uuid4(),
+            "session_id": session_id,
+            "role_model": role,
+            "content": content,
+            "message_metadata": metadata,
+            "created_at": self.__now__(),
+        })
+        if len(self._messages) > self.max_buffer:
+            overflow = len(self._messages) - self.max_buffer
+            del self._messages[:overflow]
+            self.dropped += overflow
+            LOGGER.error("Chat write-behind buffer full, dropped %d message(s)", overflow)
+        if len(self._messages) >= self.batch_size:
+            self._wakeup.set()
+
+    @staticmethod
+    def __rejected__(error: Exception) -> bool:
+        """
+        Whether the database refused the rows themselves (data exception or integrity violation).
+
+        asyncpg server errors mostly surface as a plain `DBAPIError`, so the
+        SQLSTATE class decides: timeouts, deadlocks, serialization failures
+        and connection limits are worth retrying as they are.
+        """
+        if isinstance(error, (exc.IntegrityError, exc.DataError)):
+            return True
+        if not isinstance(error, exc.DBAPIError) or error.connection_invalidated:
+            return False
+        sqlstate = getattr(error.orig, "sqlstate", None) or getattr(error.orig, "pgcode", None)
+        return isinstance(sqlstate, str) and sqlstate[:2] in ("22", "23")
+
+    async def __write__(self, sessions: list[dict[str, Any]], messages: list[dict[str, Any]]):
+        from src.auth.models import ChatSession, ChatMessage
+
+        async with self.session_maker() as session:
+            if sessions:
+                await session.execute(insert(ChatSession).on_conflict_do_nothing(index_elements=["id"]), sessions)
+            if messages:
+                await session.execute(insert(ChatMessage).on_conflict_do_nothing(index_elements=["id"]), messages)
+            await session.commit()
+
+    async def __bisect__(self, rows: list[dict[str, Any]], kind: str) -> int:
+        """Write `rows` in ever smaller halves, dropping single rows the database rejects; returns rows written."""
+        if not rows:
+            return 0
+        try:
+            await (self.__write__(rows, []) if kind == "session" else self.__write__([], rows))
+            return len(rows)
+        except Exception as e:
+            if not self.__rejected__(e):
+                raise
+            if len(rows) == 1:
+                if kind == "message":
+                    self.dropped += 1
+                else:
+                    # Let the next message of this session enqueue it again
+                    self._known_sessions.pop(rows[0]["id"], None)
+                LOGGER.error("Dropping chat %s %s rejected by the database: %s", kind, rows[0]["id"], e)
+                return 0
+        middle = len(rows) // 2
+        return await self.__bisect__(rows[:middle], kind) + await self.__bisect__(rows[middle:], kind)
+
+    async def flush(self):
+        sessions, self._sessions = self._sessions, []
+        messages, self._messages = self._messages, []
+        if not sessions and not messages:
+            return
+        try:
+            try:
+                await self.__write__(sessions, messages)
+                stored = len(messages)
+            except Exception as e:
+                if not self.__rejected__(e):
+                    raise
+                LOGGER.warning("Database rejected a batch of %d session(s) and %d message(s), isolating bad rows: %s",
+                               len(sessions), len(messages), e)
+                # Sessions first, so messages are only rejected for sessions that could not be stored
+                await self.__bisect__(sessions, "session")
+                stored = await self.__bisect__(messages, "message")
+        except (Exception, asyncio.CancelledError) as e:
+            # Rows already written are skipped on retry
+            self._sessions[:0] = sessions
+            self._messages[:0] = messages
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._backoff = min(self.MAX_BACKOFF_S, max(self.flush_interval, self._backoff * 2))
+            LOGGER.error("Failed to persist %d session(s) and %d message(s), will retry in %.1f s: %s",
+                         len(sessions), len(messages), self._backoff, e)
+            return
+        self._backoff = 0.0
+        self.flushed += stored
+        LOGGER.debug("Persisted %d session(s) and %d message(s)", len(sessions), stored)
+
+    async def __run__(self):
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            deadline = loop.time() + (self._backoff or self.flush_interval)
+            while not self._stopping:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                self._wakeup.clear()
+                if not self._backoff:
+                    break  # a full batch flushes early, unless the database is being given time
+            await self.flush()
+
+    async def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self.__run__())
+
+    async def close(self):
+        if self._task is not None:
+            # Let a flush in flight finish instead of cancelling it halfway
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "pending_sessions": len(self._sessions),
+            "pending_messages": len(self._messages),
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+        }
+
+
+chat_store = ChatWriteBehind(
+    async_session_maker,
+    flush_interval=chat_settings.CHAT_PERSIST_INTERVAL_S,
+    batch_size=chat_settings.CHAT_PERSIST_BATCH_SIZE,
+    max_buffer=chat_settings.CHAT_PERSIST_MAX_BUFFER,
+)
@@ -1,9 +1,12 @@
+import logging
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 from fastapi_users.jwt import SecretType
 
 class BaseAppSettings(BaseSettings):
     class Config:
         env_file_encoding = 'utf-8'
+        extra = 'ignore'
 
 class DatabaseSettings(BaseAppSettings):
     POSTGRES_HOST: str
@@ -11,6 +14,15 @@ class DatabaseSettings(BaseAppSettings):
     POSTGRES_NAME: str
     POSTGRES_USER: str
     POSTGRES_PASS: str
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_S: float = 30.0
+    DB_POOL_RECYCLE_S: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_QUERY_CACHE_SIZE: int = 500
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100
+    DB_SLOW_QUERY_MS: float = 200.0
     
     class Config:
         env_file = './env/database.env'
@@ -18,9 +30,93 @@ class DatabaseSettings(BaseAppSettings):
 class ProductionSettings(BaseAppSettings):
     SECRET_AUTH: SecretType
     HF_TOKEN: str
+    USER_SETTINGS_CACHE_TTL_S: float = 60.0
+    USER_SETTINGS_CACHE_SIZE: int = 10000
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    AUTH_USER_CACHE_TTL_S: float = 30.0
+    AUTH_USER_CACHE_SIZE: int = 10000
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_BULK_WORKERS: int = 2
+    PROVISION_BATCH_SIZE: int = 500
+
+    class Config:
+        env_file = './env/production.env'
+
+class ModelSettings(BaseAppSettings):
+    WARMUP_MODELS: list[str] = ["stt", "tts_processor", "tts", "vocoder", "speaker_embeddings"]
+    WARMUP_RETRIES: int = 5
+    WARMUP_BACKOFF_S: float = 2.0
+    STT_MAX_BATCH_SIZE: int = 8
+    STT_MAX_WAIT_MS: float = 20.0
+    STT_STREAM_WINDOW_S: float = 20.0
+    STT_STREAM_OVERLAP_S: float = 2.0
+    TTS_CACHE_MEMORY_MB: int = 64
+    TTS_CACHE_DIR: str = "data/audio/cache"
+    TTS_CACHE_DISK_MB: int = 1024
+    SPEAKER_STORE_PATH: str = "data/speakers/cmu_arctic_xvectors.npy"
+    DEFAULT_SPEAKER_ID: int = 7306
+    INFERENCE_MODE: str = "local"
+    STT_BACKEND: str = "torch"
+    TTS_BACKEND: str = "torch"
+    INFERENCE_SOCKET: str = "data/inference.sock"
+
+    class Config:
+        env_file = './env/production.env'
+
+class ChatSettings(BaseAppSettings):
+    LLM_STREAM_URL: str = "ws://localhost:2222/stream"
+    LLM_POOL_SIZE: int = 32
+    LLM_POOL_TIMEOUT_S: float = 5.0
+    LLM_MAX_REUSE: int = 100
+    LLM_IDLE_TIMEOUT_S: float = 60.0
+    LLM_PING_INTERVAL_S: float = 20.0
+    CHAT_FLUSH_INTERVAL_MS: float = 50.0
+    CHAT_FLUSH_BYTES: int = 256
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SLOW_CONSUMER_POLICY: str = "drop"
+    PUBSUB_BACKEND: str = "memory"
+    PUBSUB_SOCKET: str = "data/pubsub.sock"
+    CHAT_PERSIST_INTERVAL_S: float = 1.0
+    CHAT_PERSIST_BATCH_SIZE: int = 200
+    CHAT_PERSIST_MAX_BUFFER: int = 10000
+    CONTEXT_MAX_TOKENS: int = 4096
+    CONTEXT_MESSAGE_OVERHEAD: int = 4
+    CONTEXT_TOKENIZER: str = ""
+    CONTEXT_TOKEN_CACHE_SIZE: int = 4096
+
+    class Config:
+        env_file = './env/production.env'
+
+class LoggingSettings(BaseAppSettings):
+    LOG_FORMAT: str = "json"
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: dict[str, str] = {}
+    LOG_SAMPLE_RATE: float = 0.01
+    LOG_RATE_LIMIT_PER_S: float = 1.0
+    LOG_RATE_LIMIT_BURST: int = 10
+
+    @staticmethod
+    def __check_level__(level: str) -> str:
+        level = level.upper()
+        if not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f"Unknown log level {level!r}, expected one of DEBUG, INFO, WARNING, ERROR, CRITICAL")
+        return level
+
+    @field_validator("LOG_LEVEL")
+    @classmethod
+    def __validate_level__(cls, level: str) -> str:
+        return cls.__check_level__(level)
+
+    @field_validator("LOG_LEVELS")
+    @classmethod
+    def __validate_levels__(cls, levels: dict[str, str]) -> dict[str, str]:
+        return {name: cls.__check_level__(level) for name, level in levels.items()}
 
     class Config:
         env_file = './env/production.env'
 
 database_settings = DatabaseSettings()
-prod_settings = ProductionSettings()
\ No newline at end of file
+prod_settings = ProductionSettings()
+model_settings = ModelSettings()
+chat_settings = ChatSettings()
+logging_settings = LoggingSettings()
@@ -0,0 +1,220 @@
+import time
+import uuid
+import asyncio
+from contextlib import aclosing
+from typing import Any, Hashable
+from fastapi import WebSocket, WebSocketDisconnect
+
+from src.chat import stream_reply, coalesce, END_OF_STREAM
+from src.config import chat_settings
+from src.context import ConversationContext
+from src.pubsub import PubSubBackend, InProcessPubSub, create_backend
+
+from src.logger import CustomLogger
+LOGGER = CustomLogger(__name__)
+
+class Connection:
+    """
+    One client WebSocket with its own bounded send queue.
+
+    Every frame for the socket goes through the queue and is written by a
+    dedicated drain task, so a slow client only ever blocks itself and
+    frames from different producers never interleave on the socket.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: Hashable, queue_size: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.rooms: set[str] = set()
+        self.dropped = 0
+        self._closed = asyncio.Event()
+        self._drain_task: asyncio.Task | None = None
+
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+
+    def mark_closed(self):
+        """Stop accepting frames and release producers waiting in `send`."""
+        self._closed.set()
+        if self._drain_task is not None:
+            self._drain_task.cancel()
+
+    def start(self):
+        self._drain_task = asyncio.create_task(self.__drain__())
+
+    async def __drain__(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                if isinstance(message, str):
+                    await self.websocket.send_text(message)
+                else:
+                    await self.websocket.send_json(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            LOGGER.info("Stopped sending to client #%s: %s", self.user_id, e)
+            self._closed.set()
+
+    async def send(self, message: Any):
+        """
+        Queue a frame, waiting for room; used for the client's own reply stream.
+
+        Raises `WebSocketDisconnect` once the connection is closed, including
+        while waiting for room, so a producer never outlives the drain task.
+        """
+        if self.closed:
+            raise WebSocketDisconnect(code=1006)
+        try:
+            self.queue.put_nowait(message)
+            return
+        except asyncio.QueueFull:
+            pass
+        put = asyncio.ensure_future(self.queue.put(message))
+        closed = asyncio.ensure_future(self._closed.wait())
+        try:
+            await asyncio.wait((put, closed), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            closed.cancel()
+            if not put.done():
+                put.cancel()
+        if put.cancelled() or not put.done():
+            raise WebSocketDisconnect(code=1006)
+
+    def offer(self, message: Any) -> bool:
+        """Queue a frame without waiting; returns False when the client is not keeping up."""
+        if self.closed:
+            return True
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def close(self, code: int = 1000):
+        self.mark_closed()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+
+class ConnectionManager:
+    """
+    Tracks client sockets by user and by room and fans messages out to them.
+
+    A user may hold several sockets at once. Room messages are published on
+    a pub/sub backend, so with a cross-process backend they also reach
+    subscribers held by other workers; each worker then delivers them to
+    its own sockets. Fan-out never awaits a client: frames
+    are offered to each socket's queue, and sockets whose queue is full
+    either lose the frame (`"drop"`) or are disconnected (`"disconnect"`),
+    depending on `slow_consumer_policy`.
+    """
+
+    def __init__(self, queue_size: int = 256, slow_consumer_policy: str = "drop",
+                 backend: PubSubBackend | None = None):
+        if slow_consumer_policy not in ("drop", "disconnect"):
+            raise ValueError(f"Unknown slow consumer policy: {slow_consumer_policy}")
+        self.queue_size = queue_size
+        self.slow_consumer_policy = slow_consumer_policy
+        self.backend = backend or InProcessPubSub()
+        self.active_connections: dict[str, set[Connection]] = {}
+        self.rooms: dict[str, set[Connection]] = {}
+
+    async def start(self):
+        await self.backend.start(self.__deliver__)
+
+    async def close(self):
+        await self.backend.close()
+
+    async def connect(self, websocket: WebSocket, user_id: Hashable) -> Connection:
+        await websocket.accept()
+        connection = Connection(websocket, user_id, self.queue_size)
+        connection.start()
+        self.active_connections.setdefault(str(user_id), set()).add(connection)
+        return connection
+
+    def disconnect(self, connection: Connection) -> set[str]:
+        """Forget `connection` and return the rooms it was subscribed to."""
+        sockets = self.active_connections.get(str(connection.user_id))
+        if sockets is not None:
+            sockets.discard(connection)
+            if not sockets:
+                del self.active_connections[str(connection.user_id)]
+        rooms = set(connection.rooms)
+        for room in rooms:
+            self.leave(connection, room)
+        connection.mark_closed()
+        return rooms
+
+    def join(self, connection: Connection, room: str):
+        self.rooms.setdefault(room, set()).add(connection)
+        connection.rooms.add(room)
+
+    def leave(self, connection: Connection, room: str):
+        members = self.rooms.get(room)
+        if members is not None:
+            members.discard(connection)
+            if not members:
+                del self.rooms[room]
+        connection.rooms.discard(room)
+
+    def __fan_out__(self, connections, message: Any):
+        for connection in list(connections):
+            if not connection.offer(message) and self.slow_consumer_policy == "disconnect":
+                LOGGER.warning("Disconnecting slow client #%s", connection.user_id)
+                self.disconnect(connection)
+                asyncio.create_task(connection.close(code=1013))
+
+    def __deliver__(self, channel: str, message: Any):
+        kind, _, name = channel.partition(":")
+        if kind == "room":
+            self.__fan_out__(self.rooms.get(name, ()), message)
+
+    def publish(self, room: str, message: Any):
+        self.backend.publish(f"room:{room}", message)
+
+    @staticmethod
+    async def send_personal_message(connection: Connection, message: str, session_id: uuid.UUID | None = None,
+                                    context: ConversationContext | None = None):
+        """Stream AI model response to the client WebSocket in real time."""
+    
+        try:
+            reply = stream_reply(message, user_id=connection.user_id, session_id=session_id, context=context)
+            deltas_sent, chars = 0, 0
+            start = time.perf_counter()
+            async with aclosing(coalesce(reply)) as deltas:
+                async for delta in deltas:
+                    deltas_sent += 1
+                    chars += len(delta)
+                    await connection.send({"response": delta})
+            await connection.send({"response": END_OF_STREAM})
+            LOGGER.info("Reply streamed", extra={"fields": {
+                "deltas": deltas_sent, "chars": chars, "prompt_chars": len(message),
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+            }})
+    
+        except WebSocketDisconnect:
+            raise
+        except Exception as e:
+            await connection.send({"Error": str(e)})
+
+    def stats(self) -> dict[str, int]:
+        connections = [c for sockets in self.active_connections.values() for c in sockets]
+        return {
+            "users": len(self.active_connections),
+            "connections": len(connections),
+            "rooms": len(self.rooms),
+            "dropped": sum(c.dropped for c in connections),
+        }
+
+
+manager = ConnectionManager(
+    queue_size=chat_settings.WS_SEND_QUEUE_SIZE,
+    slow_consumer_policy=chat_settings.WS_SLOW_CONSUMER_POLICY,
+    backend=create_backend(chat_settings.PUBSUB_BACKEND, chat_settings.PUBSUB_SOCKET),
+)
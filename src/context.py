@@ -0,0 +1,150 @@
+import math
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Callable
+
+from src.config import chat_settings
+
+from src.logger import CustomLogger
+LOGGER = CustomLogger(__name__)
+
+@dataclass(frozen=True)
+class ContextMessage:
+    role: str
+    content: str
+    tokens: int
+
+class TokenCounter:
+    """
+    Counts tokens of message texts, remembering the counts it has seen.
+
+    Each distinct text is tokenized once; later turns and rebuilt contexts
+    look the count up in a bounded LRU instead of tokenizing again. Without
+    a `tokenize` callable the count is estimated from the text length.
+
+    Args:
+        tokenize (Callable[[str], list] | None): Returns the tokens of a text.
+        max_entries (int): Number of texts whose counts are kept.
+    """
+
+    CHARS_PER_TOKEN = 4
+
+    def __init__(self, tokenize: Callable[[str], list] | None = None, max_entries: int = 4096):
+        self.tokenize = tokenize
+        self.max_entries = max_entries
+        self._counts: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __measure__(self, text: str) -> int:
+        if self.tokenize is None:
+            return math.ceil(len(text) / self.CHARS_PER_TOKEN)
+        return len(self.tokenize(text))
+
+    def count(self, text: str) -> int:
+        with self._lock:
+            tokens = self._counts.get(text)
+            if tokens is not None:
+                self._counts.move_to_end(text)
+                self.hits += 1
+                return tokens
+            self.misses += 1
+        tokens = self.__measure__(text)
+        with self._lock:
+            self._counts[text] = tokens
+            if len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return tokens
+
+    def stats(self) -> dict[str, int]:
+        return {"entries": len(self._counts), "hits": self.hits, "misses": self.misses}
+
+class ConversationContext:
+    """
+    The slice of a conversation that is sent to the LLM, kept under a token budget.
+
+    Messages carry their token count from the moment they are added, so
+    keeping the budget is arithmetic on a running total rather than
+    re-templating and re-tokenizing the whole history every turn. When a
+    new message pushes the total over `max_tokens`, the oldest messages are
+    dropped; the newest message is always kept.
+
+    Args:
+        counter (TokenCounter): Shared token counter.
+        max_tokens (int): Token budget of the context.
+        message_overhead (int): Tokens the chat template adds per message.
+    """
+
+    def __init__(self, counter: TokenCounter, max_tokens: int, message_overhead: int = 4):
+        self.counter = counter
+        self.max_tokens = max_tokens
+        self.message_overhead = message_overhead
+        self._messages: deque[ContextMessage] = deque()
+        self.total_tokens = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def append(self, role: str, content: str):
+        message = ContextMessage(role, content, self.counter.count(content) + self.message_overhead)
+        self._messages.append(message)
+        self.total_tokens += message.tokens
+        self.__trim__()
+
+    def __trim__(self):
+        while self.total_tokens > self.max_tokens and len(self._messages) > 1:
+            oldest = self._messages.popleft()
+            self.total_tokens -= oldest.tokens
+            self.dropped += 1
+
+    def sync(self, history: list[dict]):
+        """
+        Rebuild the context from a UI chat history, e.g. after a message was edited.
+
+        The history is walked from the newest message back and only until
+        the budget is spent, so the cost follows the context size, not the
+        conversation length. Only plain text turns are kept; attachments and
+        tool messages (those with a metadata title) are skipped. Counts come
+        from the shared counter, so unchanged messages are not tokenized again.
+        """
+        kept: list[ContextMessage] = []
+        total = 0
+        for message in reversed(history):
+            content = message.get("content")
+            if not isinstance(content, str) or not content.strip():
+                continue
+            if (message.get("metadata") or {}).get("title"):
+                continue
+            tokens = self.counter.count(content) + self.message_overhead
+            if kept and total + tokens > self.max_tokens:
+                break
+            kept.append(ContextMessage(message["role"], content, tokens))
+            total += tokens
+        self._messages = deque(reversed(kept))
+        self.total_tokens = total
+
+    def messages(self) -> list[dict[str, str]]:
+        return [{"role": m.role, "content": m.content} for m in self._messages]
+
+
+__tokenizer__ = None
+
+def __tokenize__(text: str) -> list:
+    global __tokenizer__
+    if __tokenizer__ is None:
+        from transformers import AutoTokenizer
+        __tokenizer__ = AutoTokenizer.from_pretrained(chat_settings.CONTEXT_TOKENIZER)
+        LOGGER.info("Context tokenizer loaded from %s", chat_settings.CONTEXT_TOKENIZER)
+    return __tokenizer__.encode(text, add_special_tokens=False)
+
+token_counter = TokenCounter(
+    __tokenize__ if chat_settings.CONTEXT_TOKENIZER else None,
+    max_entries=chat_settings.CONTEXT_TOKEN_CACHE_SIZE,
+)
+
+def new_context() -> ConversationContext:
+    return ConversationContext(token_counter, chat_settings.CONTEXT_MAX_TOKENS,
+                               chat_settings.CONTEXT_MESSAGE_OVERHEAD)
@@ -6,12 +6,27 @@ from typing import AsyncGenerator
 from sqlalchemy.ext.declarative import declarative_base
 from src.config import database_settings as settings
 from sqlalchemy import MetaData, select
+from sqlalchemy.dialects.postgresql import insert
+from src.db_metrics import TimedQueuePool, QueryMetrics, pool_stats
 
 from src.logger import CustomLogger
 LOGGER = CustomLogger(__name__)
 
 DATABASE_URL = f"postgresql+asyncpg://{settings.POSTGRES_USER}:{settings.POSTGRES_PASS}@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_NAME}"
-async_engine = create_async_engine(DATABASE_URL, echo=True)
+async_engine = create_async_engine(
+    DATABASE_URL,
+    echo=settings.DB_ECHO,
+    poolclass=TimedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_S,
+    pool_recycle=settings.DB_POOL_RECYCLE_S,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    query_cache_size=settings.DB_QUERY_CACHE_SIZE,
+    connect_args={"prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE},
+)
+query_metrics = QueryMetrics(slow_query_ms=settings.DB_SLOW_QUERY_MS)
+query_metrics.instrument(async_engine)
 LOGGER.info("Database connection established")
 metadata = MetaData()
 
@@ -23,7 +38,7 @@ async_session_maker = async_sessionmaker(
 LOGGER.info("Async session maker created")
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
-        LOGGER.info("Async session created")
+        LOGGER.debug("Async session created", extra={"sample": True})
         yield session
 
 @asynccontextmanager
@@ -31,21 +46,41 @@ async def acquire_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
 
+ROLES = ["user", "admin"]
+__roles__: dict[str, str] = {}
+
 async def fetch_roles():
+    """Seed the roles with one bulk upsert and cache their ids for the lifetime of the process."""
     from src.auth.models import Role
-    roles = ["user", "admin"]
     async with acquire_session() as session:
-        for name in roles:
-            exists = await session.scalar(
-                select(Role).where(Role.name == name).limit(1)
-            )
-            if not exists:
-                session.add(Role(id=uuid.uuid4(), name=name, permissions={}))
+        await session.execute(
+            insert(Role).on_conflict_do_nothing(index_elements=["name"]),
+            [{"id": uuid.uuid4(), "name": name, "permissions": {}} for name in ROLES],
+        )
+        roles = (await session.execute(select(Role.id, Role.name))).all()
         await session.commit()
+    __roles__.clear()
+    __roles__.update({name: str(id_) for id_, name in roles})
     LOGGER.info("Roles created or verified.")
 
 async def get_roles() -> dict[str, str]:
-    from src.auth.models import Role
-    async with acquire_session() as session:
-        result = await session.execute(select(Role.id, Role.name))
-        return {name: str(id_) for id_, name in result.all()}
\ No newline at end of file
+    if not __roles__:
+        await fetch_roles()
+    return __roles__
+
+
+def database_stats() -> dict:
+    return {
+        "pool": pool_stats(async_engine),
+        "settings": {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout_s": settings.DB_POOL_TIMEOUT_S,
+            "pool_recycle_s": settings.DB_POOL_RECYCLE_S,
+            "pool_pre_ping": settings.DB_POOL_PRE_PING,
+            "query_cache_size": settings.DB_QUERY_CACHE_SIZE,
+            "prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE,
+            "slow_query_ms": settings.DB_SLOW_QUERY_MS,
+        },
+        **query_metrics.snapshot(),
+    }
\ No newline at end of file
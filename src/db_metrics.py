@@ -0,0 +1,197 @@
+import re
+import time
+import bisect
+from typing import Any
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.logger import CustomLogger
+LOGGER = CustomLogger(__name__)
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram in milliseconds.
+
+    Observing is a bisect and two additions, cheap enough for every
+    statement. Percentiles are estimated from bucket bounds.
+    """
+
+    BOUNDS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(self.BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def merge(self, other: "LatencyHistogram"):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return float(bound)
+        return self.max_ms
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "buckets": {f"le_{bound}": count for bound, count in zip(self.BOUNDS_MS, self.counts)}
+                       | {"le_inf": self.counts[-1]},
+        }
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that records how long checkouts wait for an idle connection.
+
+    Only the wait on the pool's queue counts as checkout wait; opening a
+    new connection (overflow, TLS, authentication) is recorded separately
+    as connect time.
+    """
+
+    checkout_wait = LatencyHistogram()
+    connect_time = LatencyHistogram()
+    checkout_timeouts = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        get = self._pool.get
+
+        def __timed_get__(block=True, timeout=None):
+            start = time.perf_counter()
+            try:
+                return get(block, timeout)
+            finally:
+                TimedQueuePool.checkout_wait.observe((time.perf_counter() - start) * 1000)
+
+        self._pool.get = __timed_get__
+
+    def _do_get(self):
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            TimedQueuePool.checkout_timeouts += 1
+            raise
+
+    def _create_connection(self):
+        start = time.perf_counter()
+        try:
+            return super()._create_connection()
+        finally:
+            TimedQueuePool.connect_time.observe((time.perf_counter() - start) * 1000)
+
+def redact(parameters) -> Any:
+    """Replace bound values by their type names, so slow-query logs carry no user data."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f"<{len(parameters)} rows>"
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+class QueryMetrics:
+    """
+    Per-statement latency histograms and a slow-query log for an engine.
+
+    Statements are keyed by their SQL text with whitespace collapsed; the
+    SQL carries placeholders, never values. Past `max_statements` distinct
+    statements, new ones are counted under `"<other>"`.
+
+    Args:
+        slow_query_ms (float): Statements slower than this are logged, 0 disables the log.
+        max_statements (int): Number of distinct statements tracked.
+    """
+
+    OTHER = "<other>"
+
+    def __init__(self, slow_query_ms: float = 200.0, max_statements: int = 200):
+        self.slow_query_ms = slow_query_ms
+        self.max_statements = max_statements
+        self.statements: dict[str, LatencyHistogram] = {}
+        self.errors = 0
+
+    @staticmethod
+    def normalize(statement: str) -> str:
+        return re.sub(r"\s+", " ", statement).strip()[:500]
+
+    def observe(self, statement: str, parameters, ms: float):
+        key = self.normalize(statement)
+        histogram = self.statements.get(key)
+        if histogram is None:
+            if len(self.statements) >= self.max_statements:
+                key = self.OTHER
+            histogram = self.statements.setdefault(key, LatencyHistogram())
+        histogram.observe(ms)
+        if self.slow_query_ms and ms >= self.slow_query_ms:
+            LOGGER.warning("Slow query (%.1f ms): %s params=%s", ms, key, redact(parameters))
+
+    def instrument(self, engine: AsyncEngine):
+        sync_engine = engine.sync_engine
+
+        @event.listens_for(sync_engine, "before_cursor_execute")
+        def __before__(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+        @event.listens_for(sync_engine, "after_cursor_execute")
+        def __after__(conn, cursor, statement, parameters, context, executemany):
+            start = conn.info["query_start"].pop()
+            self.observe(statement, parameters, (time.perf_counter() - start) * 1000)
+
+        @event.listens_for(sync_engine, "handle_error")
+        def __error__(context):
+            starts = context.connection.info.get("query_start") if context.connection is not None else None
+            if starts:
+                starts.pop()
+            self.errors += 1
+
+    def snapshot(self, limit: int = 50) -> dict[str, Any]:
+        ranked = sorted(self.statements.items(), key=lambda item: item[1].total_ms, reverse=True)
+        overall = LatencyHistogram()
+        for histogram in self.statements.values():
+            overall.merge(histogram)
+        return {
+            "queries": overall.snapshot(),
+            "errors": self.errors,
+            "statements": [{"statement": key, **histogram.snapshot()} for key, histogram in ranked[:limit]],
+        }
+
+def pool_stats(engine: AsyncEngine) -> dict[str, Any]:
+    pool = engine.sync_engine.pool
+    stats: dict[str, Any] = {"class": type(pool).__name__}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+            "timeout_s": pool.timeout(),
+        })
+    if isinstance(pool, TimedQueuePool):
+        stats["checkout_wait"] = pool.checkout_wait.snapshot()
+        stats["connect_time"] = pool.connect_time.snapshot()
+        stats["checkout_timeouts"] = TimedQueuePool.checkout_timeouts
+    return stats
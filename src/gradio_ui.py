@@ -1,17 +1,21 @@
-from src.model import __audiofile_to_text__
-import websockets
-import json
+from src.model import __stream_audiofile_to_text__
+from src.speech.audio import is_audio_file
+from src.chat import stream_reply, coalesce
+import time
+from contextlib import aclosing
 import gradio as gr
-import httpx
 from src.i18n import _
+from src.config import model_settings
+from src.auth.tokens import user_id_from_token
+from src.chat_store import chat_session_id
+from src.context import new_context
+from src.user_settings import settings_service
 
-from src.logger import CustomLogger
+from src.logger import CustomLogger, session_id_var
 LOGGER = CustomLogger(__name__)
 
 GRADIO_CSS = 'src/static/custom_gradio.css'
-BASE_URL = '127.0.0.1:8000'
 AGENT_ID = 'chat'
-HEADERS = {'Content-Type': 'application/json'}
 
 
 theme = gr.themes.Default(
@@ -31,29 +35,27 @@ theme = gr.themes.Default(
 )
 
 
-async def send_message(session_id: str, message: str, cookies: gr.Request):
-    url = f"ws://{BASE_URL}/ws_sendMessages"
-    headers = {'Cookie': f"{cookies}"}
-    payload = {"role": "user", "content": message, "metadata": "None"}
-    LOGGER.info("Sending message to the server with payload: %s", payload)
-    try:
-        async with websockets.connect(url, additional_headers=headers) as websocket:
-            await websocket.send(json.dumps(payload))
-            while True:
-                try:
-                    response = await websocket.recv()
-                    LOGGER.info("Received response from the server: %s", response)
-                    yield json.loads(response)
-                except websockets.exceptions.ConnectionClosedOK:
-                    LOGGER.info("Connection closed normally.")
-                    break
-                except Exception as e:
-                    LOGGER.error("Stream error: %s", e)
-                    break
-            await websocket.close()
-    except Exception as exc:
-        LOGGER.error(f"Error during sending message: {str(exc)}")
-        yield  {"Error while accepting message": str(exc)}
+async def send_message(session_id: str, message: str, user_id=None, context=None):
+    """
+    Stream the reply to `message` in-process, without a loopback WebSocket to our own server.
+
+    Tokens are coalesced into deltas, so the chat re-renders once per flush
+    window instead of once per token. For a logged-in `user_id` the exchange
+    is stored in that user's chat history.
+    """
+    chat_id = chat_session_id(user_id, session_id) if user_id is not None else None
+    reply = stream_reply(message, user_id=user_id, session_id=chat_id, context=context)
+    deltas_sent, chars = 0, 0
+    start = time.perf_counter()
+    async with aclosing(coalesce(reply)) as deltas:
+        async for delta in deltas:
+            deltas_sent += 1
+            chars += len(delta)
+            yield delta
+    LOGGER.info("Reply streamed", extra={"fields": {
+        "deltas": deltas_sent, "chars": chars, "prompt_chars": len(message),
+        "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+    }})
 
 
 async def __add_message__(message: dict, history: list, state: dict, request: gr.Request):  # {'text': '123', 'files': []}
@@ -61,34 +63,35 @@ async def __add_message__(message: dict, history: list, state: dict, request: gr
         if "session_id" not in state:
             state["session_id"] = request.session_hash
             LOGGER.info("New session created: %s", state["session_id"])
+        session_id = state["session_id"]
+        session_id_var.set(session_id)
+        user_id = user_id_from_token(request.cookies.get("bonds"))
 
         if message is not None:
-            session_id = state.get("session_id")
             history.append({"role": "user", "content": message["text"]})
-            LOGGER.info("User message added to history: %s", message["text"])
+            LOGGER.debug("User message added to history", extra={"fields": {"chars": len(message["text"])}})
 
         if message and len(message["files"]) > 0:
             for file_path in message["files"]:
-                if file_path.endswith(".wav"):
-                    transcribed_text = await __audiofile_to_text__(file_path)
+                if is_audio_file(file_path):
+                    transcribed_text = ""
+                    async for transcribed_text in __stream_audiofile_to_text__(file_path):
+                        yield _("🎤 {text}").format(text=transcribed_text), state
                     history.append({"role": "user", "content": file_path, "metadata": {"title": "🎤 User audio"}})
                     history.append({"role": "user", "content": transcribed_text})
-                    LOGGER.info("Transcribed audio file: %s -> %s", file_path, transcribed_text)
+                    LOGGER.info("Transcribed audio file %s", file_path, extra={"fields": {"chars": len(transcribed_text)}})
 
         prompt = history[-1]["content"]
-        history.append({"role": "assistant", "content": " "})
-        LOGGER.info("Prompt message added to history: %s", prompt)
-        async for response_data in send_message(session_id, prompt, request.headers.get("cookie")):
-            token = response_data.get("response", "No response")
-            if isinstance(token, dict):
-                if token.get("end_of_stream"):
-                    LOGGER.info("Detected end_of_stream flag; finishing stream processing...")
-                    break
-            history[-1]["content"] += token
-            
-            yield history[-1]["content"], state
-
-        state["history"] = history
+        # Rebuilt from the UI history so edits are picked up; token counts of unchanged turns are cached
+        context = state.setdefault("context", new_context())
+        context.sync(history[:-1])
+        reply = ""
+        async for delta in send_message(session_id, prompt, user_id, context):
+            reply += delta
+            # ChatInterface takes the whole message on each yield, but Gradio diffs it against the previous one
+            # and streams only the appended text, so each yield costs one coalesced delta on the wire
+            yield reply, state
+        LOGGER.debug("Finished streaming reply", extra={"fields": {"context_tokens": context.total_tokens}})
 
     except Exception as e:
         LOGGER.error("Error in __add_message__: %s", str(e))
@@ -147,13 +150,14 @@ def create_setting_ui():
             rep_penalty = gr.Slider(0.0, 2.0, value=1.0, step=0.1, label="rep_penalty", interactive=True)
             new_tokens = gr.Slider(64, 8192, value=1024, step=1, label="new_tokens", interactive=True)
             sample = gr.Radio([True, False], value=False, label="sample", interactive=True)
+            voice = gr.Number(value=model_settings.DEFAULT_SPEAKER_ID, precision=0, minimum=0, label="voice", interactive=True)
             with gr.Column():
                 with gr.Row(elem_classes=["update-button"]):
                     button_update = gr.Button(_("Update"), size="md", variant="primary")
 
             button_update.click(
                 fn=put_settings,
-                inputs=[temp, top_k, rep_penalty, new_tokens, sample],
+                inputs=[temp, top_k, rep_penalty, new_tokens, sample, voice],
                 outputs=None,
                 queue=False
             )
@@ -161,7 +165,7 @@ def create_setting_ui():
             blocks.load(
                 fn=get_settings,
                 inputs=None,
-                outputs=[temp, top_k, rep_penalty, new_tokens, sample],
+                outputs=[temp, top_k, rep_penalty, new_tokens, sample, voice],
             )
 
     return blocks
@@ -173,55 +177,53 @@ def load_default_preset():
         'top_k': 50,
         'rep_penalty': 1.0,
         'new_tokens': 1024,
-        'sample': False
+        'sample': False,
+        'voice': model_settings.DEFAULT_SPEAKER_ID
     }
 
 async def get_settings(request : gr.Request):
-    url = f"http://{BASE_URL}/api/v1/user/settings"
-    cookies = request.cookies.get('bonds')
-    headers = {'Content-Type': 'application/json', 'Cookie': f"bonds={cookies}"}
-    LOGGER.info("Fetching settings from: %s", url)
-    async with httpx.AsyncClient(timeout=10) as client:
-        response = await client.get(url, headers=headers)
-    if response.status_code == 200:
-        updated_settings = response.json()
-        LOGGER.info("Settings received: %s", updated_settings)
-        return (
-            updated_settings["temp"],
-            updated_settings["top_k"],
-            updated_settings["rep_penalty"],
-            updated_settings["new_tokens"],
-            updated_settings["sample"],
-        )  
-    elif response.status_code == 401:
+    user_id = user_id_from_token(request.cookies.get('bonds'))
+    if user_id is None:
         LOGGER.warning("Unauthorized access to settings")
         raise gr.Error(_("Login to save settings"))
-    else:
-        LOGGER.error("Failed to fetch settings: %d", response.status_code)
-        raise gr.Error(_("Failed to fetch settings: {code}").format(code=response.status_code))
-
-async def put_settings(request: gr.Request, temp, top_k, rep_penalty, new_tokens, sample):
+    try:
+        stored, _etag = await settings_service.get(user_id)
+    except Exception as e:
+        LOGGER.error("Failed to fetch settings: %s", e)
+        raise gr.Error(_("Failed to fetch settings: {code}").format(code=e))
+    updated_settings = {**load_default_preset(), **stored}
+    LOGGER.info("Settings received: %s", updated_settings)
+    return (
+        updated_settings["temp"],
+        updated_settings["top_k"],
+        updated_settings["rep_penalty"],
+        updated_settings["new_tokens"],
+        updated_settings["sample"],
+        updated_settings["voice"],
+    )
+
+async def put_settings(request: gr.Request, temp, top_k, rep_penalty, new_tokens, sample, voice):
+    if voice is None:
+        voice = model_settings.DEFAULT_SPEAKER_ID
+    elif voice < 0:
+        raise gr.Error(_("Voice must be a non-negative number"))
     params = {
         "temp": temp,
         "top_k": top_k,
         "rep_penalty": rep_penalty,
         "new_tokens": new_tokens,
-        "sample": sample
+        "sample": sample,
+        "voice": int(voice)
     }
-    url = f"http://{BASE_URL}/api/v1/user/settings"
-    cookies = request.cookies.get('bonds')
-    headers = {'Content-Type': 'application/json', 'Cookie': f"bonds={cookies}"}
-    LOGGER.info("Updating settings at: %s with params: %s", url, params)
-    async with httpx.AsyncClient(timeout=10) as client:
-        response = await client.put(url, headers=headers, json=params)
-    if response.status_code == 200:
-        LOGGER.info("Settings successfully updated")
-        return None
-    if response.status_code == 401:
+    user_id = user_id_from_token(request.cookies.get('bonds'))
+    if user_id is None:
         LOGGER.warning("Unauthorized attempt to update settings")
-        raise gr.Error(_(f"Login to save settings"))
-    else:
-        LOGGER.error("Failed to update settings: %d", response.status_code)
-        raise gr.Error(_("Failed to update settings: {code}").format(code=response.status_code))
-
-
+        raise gr.Error(_("Login to save settings"))
+    LOGGER.info("Updating settings of user %s with params: %s", user_id, params)
+    try:
+        await settings_service.patch(user_id, params)
+    except Exception as e:
+        LOGGER.error("Failed to update settings: %s", e)
+        raise gr.Error(_("Failed to update settings: {code}").format(code=e))
+    LOGGER.info("Settings successfully updated")
+    return None
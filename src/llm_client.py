@@ -0,0 +1,135 @@
+import json
+import time
+import asyncio
+from typing import Any, AsyncIterator
+import websockets
+from websockets.protocol import State
+
+from src.config import chat_settings
+
+from src.logger import CustomLogger
+LOGGER = CustomLogger(__name__)
+
+class LLMPoolExhausted(Exception):
+    pass
+
+class PooledConnection:
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.uses = 0
+        self.idle_since = time.monotonic()
+
+class LLMStreamPool:
+    """
+    Bounded pool of persistent WebSocket connections to the LLM stream server.
+
+    The upstream protocol carries one reply per connection at a time and
+    marks its end with an `{"end_of_stream": true}` token, so connections
+    are reused sequentially (up to `max_uses` replies) rather than
+    multiplexed. At most `size` streams run at once; further callers wait
+    up to `acquire_timeout` seconds and then fail with `LLMPoolExhausted`.
+
+    Args:
+        uri (str): Upstream WebSocket URL.
+        size (int): Maximum number of concurrent upstream connections.
+        acquire_timeout (float): Seconds to wait for a free connection.
+        max_uses (int): Replies served by a connection before it is recycled.
+        idle_timeout (float): Idle connections older than this are closed.
+        ping_interval (float): Keepalive ping interval of each connection.
+    """
+
+    def __init__(self, uri: str, size: int = 32, acquire_timeout: float = 5.0, max_uses: int = 100,
+                 idle_timeout: float = 60.0, ping_interval: float = 20.0):
+        self.uri = uri
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.max_uses = max_uses
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self._idle: list[PooledConnection] = []
+        self._slots = asyncio.Semaphore(size)
+        self.opened = 0
+        self.reused = 0
+
+    def __healthy__(self, conn: PooledConnection) -> bool:
+        return (
+            conn.websocket.state is State.OPEN
+            and conn.uses < self.max_uses
+            and time.monotonic() - conn.idle_since < self.idle_timeout
+        )
+
+    async def __checkout__(self) -> PooledConnection:
+        while self._idle:
+            conn = self._idle.pop()
+            if self.__healthy__(conn):
+                self.reused += 1
+                return conn
+            await self.__discard__(conn)
+        websocket = await websockets.connect(self.uri, ping_interval=self.ping_interval)
+        self.opened += 1
+        return PooledConnection(websocket)
+
+    def __checkin__(self, conn: PooledConnection):
+        conn.uses += 1
+        conn.idle_since = time.monotonic()
+        if self.__healthy__(conn):
+            self._idle.append(conn)
+        else:
+            asyncio.create_task(self.__discard__(conn))
+
+    @staticmethod
+    async def __discard__(conn: PooledConnection):
+        try:
+            await conn.websocket.close()
+        except Exception:
+            pass
+
+    async def stream(self, payload: dict) -> AsyncIterator[Any]:
+        """
+        Send `payload` upstream and yield the parsed tokens of the reply, end marker included.
+
+        Consume it inside `contextlib.aclosing` so the connection is returned
+        promptly when the caller stops early.
+        """
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise LLMPoolExhausted(f"All {self.size} LLM connections are busy")
+
+        conn = None
+        reusable = False
+        try:
+            conn = await self.__checkout__()
+            await conn.websocket.send(json.dumps(payload))
+            async for token in conn.websocket:
+                parsed_token = json.loads(token) if isinstance(token, str) else token
+                if isinstance(parsed_token, dict) and parsed_token.get("end_of_stream"):
+                    reusable = True  # the reply is complete even if the caller stops at the marker
+                    yield parsed_token
+                    break
+                yield parsed_token
+        finally:
+            if conn is not None:
+                if reusable:
+                    self.__checkin__(conn)
+                else:
+                    # Closed by upstream, failed, or abandoned mid-reply: the connection state is unknown.
+                    asyncio.create_task(self.__discard__(conn))
+            self._slots.release()
+
+    def stats(self) -> dict[str, int]:
+        return {"size": self.size, "idle": len(self._idle), "opened": self.opened, "reused": self.reused}
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        await asyncio.gather(*(self.__discard__(conn) for conn in idle))
+
+
+llm_pool = LLMStreamPool(
+    chat_settings.LLM_STREAM_URL,
+    size=chat_settings.LLM_POOL_SIZE,
+    acquire_timeout=chat_settings.LLM_POOL_TIMEOUT_S,
+    max_uses=chat_settings.LLM_MAX_REUSE,
+    idle_timeout=chat_settings.LLM_IDLE_TIMEOUT_S,
+    ping_interval=chat_settings.LLM_PING_INTERVAL_S,
+)
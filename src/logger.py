@@ -1,81 +1,291 @@
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from datetime import datetime
 import os
+import copy
+import json
+import time
+import queue
+import random
+import atexit
 import zipfile
+import threading
+from multiprocessing import util
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+from contextvars import ContextVar
 
-class CustomLogger:
-    LOG_DIR = "data/logs"
-    SIZE_THRESHOLD = 1 * 1024 * 1024 * 1024  # 1 GB
-    DAYS_THRESHOLD = 14  # Compress logs older than 14 day
+from src.config import logging_settings as settings
 
-    def __init__(self, name: str, to_console: bool = False):
-        self.logger = None
-        if not os.path.exists(self.LOG_DIR):
-            os.makedirs(self.LOG_DIR)
-        self.__setup_logger__(name, to_console)
-        self.__compress_old_logs__(self.SIZE_THRESHOLD, self.DAYS_THRESHOLD)
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+session_id_var: ContextVar[str | None] = ContextVar("session_id", default=None)
 
-    def __getattr__(self, attr):
-        return getattr(self.logger, attr)
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra={"fields": {...}}` adds structured fields."""
 
-    def __setup_logger__(self, name: str, to_console: bool = False):
-        self.logger = logging.getLogger(name)
-        self.logger.setLevel(logging.DEBUG)
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).astimezone().isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in ("request_id", "session_id", "suppressed"):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
 
-        if not self.logger.handlers:
-            log_filename = datetime.now().strftime("%Y-%m-%d") + "_app.log"
-            log_file_path = os.path.join(self.LOG_DIR, log_filename)
+class __ContextFilter__(logging.Filter):
+    """Stamps records with the request and session ids of the calling task."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        record.session_id = session_id_var.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keeps a random share of records logged with `extra={"sample": True}` (or an explicit rate)."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        sample = getattr(record, "sample", None)
+        if sample is None or sample is False:
+            return True
+        rate = self.rate if sample is True else sample
+        return random.random() < rate
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per `extra={"rate_key": ...}`: at most `burst` records at once, refilled at `per_second`.
 
+    The next record let through for a key reports how many were suppressed since.
+    """
+
+    MAX_KEYS = 10000
+
+    def __init__(self, per_second: float, burst: int):
+        super().__init__()
+        self.per_second = per_second
+        self.burst = burst
+        self._buckets: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, "rate_key", None)
+        if key is None:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.MAX_KEYS:
+                    self._buckets.clear()
+                bucket = self._buckets[key] = [float(self.burst), now, 0]
+            tokens, last, suppressed = bucket
+            tokens = min(float(self.burst), tokens + (now - last) * self.per_second)
+            if tokens < 1:
+                bucket[:] = [tokens, now, suppressed + 1]
+                return False
+            bucket[:] = [tokens - 1, now, 0]
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+class __QueueHandler__(QueueHandler):
+    """Like `QueueHandler`, but keeps the traceback apart from the message for the JSON formatter."""
+
+    def prepare(self, record):
+        message = record.getMessage()
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = logging.Formatter().formatException(record.exc_info)
+        record = copy.copy(record)
+        record.message = record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = exc_text
+        return record
+
+class __ConsoleFilter__(logging.Filter):
+    def filter(self, record):
+        return getattr(record, "to_console", False)
+
+class __TagConsole__(logging.Filter):
+    def filter(self, record):
+        record.to_console = True
+        return True
+
+def level_for(name: str) -> int:
+    """Level of the longest `LOG_LEVELS` entry that is `name` or a dotted prefix of it, else `LOG_LEVEL`."""
+    levels = settings.LOG_LEVELS
+    parts = name.split(".")
+    for end in range(len(parts), 0, -1):
+        level = levels.get(".".join(parts[:end]))
+        if level is not None:
+            return logging.getLevelName(level.upper())
+    return logging.getLevelName(settings.LOG_LEVEL.upper())
+
+class LogPipeline:
+    """
+    One set of log handlers for the whole process, fed through a queue.
+
+    Loggers only get a `QueueHandler`, so a log call formats the message
+    and enqueues it; a single `QueueListener` thread writes to the shared
+    rotating file (and to the console for loggers created with
+    `to_console`). Archiving old logs runs on its own background thread
+    every `ARCHIVE_INTERVAL_S` instead of in logger constructors.
+
+    Every process (web workers, inference worker, broker) shares the log
+    directory, so a pass only runs while holding an exclusive lock on
+    `ARCHIVE_LOCK`, and skips files written to within `ACTIVE_IDLE_S`:
+    a process only knows its own open file, not those of its peers.
+    """
+
+    ARCHIVE_INTERVAL_S = 3600
+    ARCHIVE_LOCK = ".archive.lock"
+    ACTIVE_IDLE_S = 24 * 3600
+
+    def __init__(self, log_dir: str, size_threshold: int, days_threshold: int):
+        self.log_dir = log_dir
+        self.size_threshold = size_threshold
+        self.days_threshold = days_threshold
+        os.makedirs(self.log_dir, exist_ok=True)
+
+        if settings.LOG_FORMAT == "json":
+            formatter = JsonFormatter()
+        else:
             formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+        log_filename = datetime.now().strftime("%Y-%m-%d") + "_app.log"
+        self.handlers: list[logging.Handler] = []
+        try:
+            file_handler = RotatingFileHandler(
+                os.path.join(self.log_dir, log_filename), maxBytes=5 * 1024 * 1024, backupCount=5
+            )
+            file_handler.setFormatter(formatter)
+            self.handlers.append(file_handler)
+        except Exception as e:
+            logging.getLogger(__name__).exception("Failed to create RotatingFileHandler: %s", e)
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        console_handler.addFilter(__ConsoleFilter__())
+        self.handlers.append(console_handler)
+
+        # Filters run on the caller's side, so dropped records never reach the queue
+        self.queue_handler = __QueueHandler__(queue.SimpleQueue())
+        self.console_queue_handler = __QueueHandler__(self.queue_handler.queue)
+        for handler in (self.queue_handler, self.console_queue_handler):
+            handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_RATE))
+            handler.addFilter(RateLimitFilter(settings.LOG_RATE_LIMIT_PER_S, settings.LOG_RATE_LIMIT_BURST))
+            handler.addFilter(__ContextFilter__())
+        self.console_queue_handler.addFilter(__TagConsole__())
+        self.logger = logging.getLogger(__name__)
+        self.logger.setLevel(level_for(__name__))
+        self.attach(self.logger)
+
+        self.__start__()
+        atexit.register(self.stop)
+        if hasattr(os, "register_at_fork"):
+            # A forked child inherits the queue but not the listener thread
+            os.register_at_fork(after_in_child=self.__restart_in_child__)
+        util.register_after_fork(self, LogPipeline.__after_process_fork__)
+
+    def __start__(self):
+        self.listener = QueueListener(self.queue_handler.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+        self._stop = threading.Event()
+        self.archiver = threading.Thread(target=self.__archive_loop__, name="log-archiver", daemon=True)
+        self.archiver.start()
+
+    def __restart_in_child__(self):
+        self.queue_handler.queue = self.console_queue_handler.queue = queue.SimpleQueue()
+        self.__start__()
+
+    def __after_process_fork__(self):
+        # multiprocessing children leave through os._exit, which skips atexit
+        util.Finalize(self, self.stop, exitpriority=-100)
+
+    def stop(self):
+        self._stop.set()
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def attach(self, logger: logging.Logger, to_console: bool = False):
+        logger.addHandler(self.console_queue_handler if to_console else self.queue_handler)
+        # Parents may be attached too; propagating would enqueue the record twice
+        logger.propagate = False
 
-            if to_console:
-                console_handler = logging.StreamHandler()
-                console_handler.setFormatter(formatter)
-                self.logger.addHandler(console_handler)
+    def __archive_loop__(self):
+        while True:
+            self.compress_old_logs()
+            if self._stop.wait(self.ARCHIVE_INTERVAL_S):
+                return
 
+    def compress_old_logs(self):
+        if fcntl is None:
+            return self.__compress_old_logs__()
+        with open(os.path.join(self.log_dir, self.ARCHIVE_LOCK), "a") as lock:
             try:
-                rotating_handler = RotatingFileHandler(
-                    log_file_path, maxBytes=5 * 1024 * 1024, backupCount=5
-                )
-                rotating_handler.setFormatter(formatter)
-                self.logger.addHandler(rotating_handler)
-            except Exception as e:
-                self.logger.exception("Failed to create RotatingFileHandler: %s", e)
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self.logger.debug("Log archiving runs in another process, skipping.")
+                return
+            try:
+                self.__compress_old_logs__()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
 
-    def __compress_old_logs__(self, size_threshold: int, days_threshold: int):
+    def __compress_old_logs__(self):
         try:
             logs_files = [
-                f for f in os.listdir(self.LOG_DIR)
-                if os.path.isfile(os.path.join(self.LOG_DIR, f)) and f.endswith(".log")
+                f for f in os.listdir(self.log_dir)
+                if os.path.isfile(os.path.join(self.log_dir, f)) and f.endswith(".log")
             ]
             if not logs_files:
                 self.logger.info("No log files found to process.")
                 return
 
             files_size = sum(
-                os.path.getsize(os.path.join(self.LOG_DIR, f)) for f in logs_files
+                os.path.getsize(os.path.join(self.log_dir, f)) for f in logs_files
             )
             oldest_file = min(
-                logs_files, key=lambda f: os.path.getmtime(os.path.join(self.LOG_DIR, f))
+                logs_files, key=lambda f: os.path.getmtime(os.path.join(self.log_dir, f))
             )
-            file_days = (datetime.now().timestamp() - os.path.getmtime(os.path.join(self.LOG_DIR, oldest_file))) / 86400
+            file_days = (datetime.now().timestamp() - os.path.getmtime(os.path.join(self.log_dir, oldest_file))) / 86400
 
             self.logger.info("Oldest log file %s is %.2f days old.", oldest_file, file_days)
 
-            if files_size >= size_threshold and file_days >= days_threshold:
+            if files_size >= self.size_threshold and file_days >= self.days_threshold:
                 zip_path = os.path.join(
-                    self.LOG_DIR, f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_logs.zip"
+                    self.log_dir, f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_logs.zip"
                 )
+                # Files still being written to, by this process or another, are archived on a later pass
+                active = {os.path.basename(h.baseFilename) for h in self.handlers if isinstance(h, logging.FileHandler)}
+                idle_since = datetime.now().timestamp() - self.ACTIVE_IDLE_S
+                archived = [
+                    f for f in logs_files
+                    if f not in active and os.path.getmtime(os.path.join(self.log_dir, f)) < idle_since
+                ]
+                if not archived:
+                    self.logger.info("No idle log files to archive.")
+                    return
                 with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=5) as zipf:
-                    for f in logs_files:
-                        full_path = os.path.join(self.LOG_DIR, f)
+                    for f in archived:
+                        full_path = os.path.join(self.log_dir, f)
                         zipf.write(full_path, arcname=f)
                         self.logger.info("Added file to archive: %s", f)
 
-                for f in logs_files:
+                for f in archived:
                     try:
-                        os.remove(os.path.join(self.LOG_DIR, f))
+                        os.remove(os.path.join(self.log_dir, f))
                         self.logger.info("Deleted log file: %s", f)
                     except Exception as e:
                         self.logger.exception("Failed to delete file %s: %s", f, e)
@@ -84,7 +294,37 @@ class CustomLogger:
             else:
                 self.logger.info(
                     "Skipping compression: size (%d/%d bytes), age (%.2f/%d days)",
-                    files_size, size_threshold, file_days, days_threshold
+                    files_size, self.size_threshold, file_days, self.days_threshold
                 )
         except Exception as e:
-            self.logger.exception("Error during log compression: %s", e)
\ No newline at end of file
+            self.logger.exception("Error during log compression: %s", e)
+
+
+class CustomLogger:
+    LOG_DIR = "data/logs"
+    SIZE_THRESHOLD = 1 * 1024 * 1024 * 1024  # 1 GB
+    DAYS_THRESHOLD = 14  # Compress logs older than 14 day
+
+    __pipeline__: LogPipeline | None = None
+    __pipeline_lock__ = threading.Lock()
+
+    def __init__(self, name: str, to_console: bool = False):
+        self.logger = None
+        self.__setup_logger__(name, to_console)
+
+    def __getattr__(self, attr):
+        return getattr(self.logger, attr)
+
+    @classmethod
+    def pipeline(cls) -> LogPipeline:
+        with cls.__pipeline_lock__:
+            if cls.__pipeline__ is None:
+                cls.__pipeline__ = LogPipeline(cls.LOG_DIR, cls.SIZE_THRESHOLD, cls.DAYS_THRESHOLD)
+            return cls.__pipeline__
+
+    def __setup_logger__(self, name: str, to_console: bool = False):
+        self.logger = logging.getLogger(name)
+        self.logger.setLevel(level_for(name))
+
+        if not self.logger.handlers:
+            self.pipeline().attach(self.logger, to_console)
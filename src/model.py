@@ -1,13 +1,25 @@
+import io
 import os
-import gradio as gr
+import re
+import struct
+import time
 import asyncio
+import threading
+from typing import Any, AsyncIterator, Callable
+import gradio as gr
 from huggingface_hub import snapshot_download
 from transformers import AutoTokenizer, AutoModelForCausalLM, SpeechT5Processor, SpeechT5ForTextToSpeech, SpeechT5HifiGan, pipeline
 import numpy as np
 import soundfile as sf
-from datasets import load_dataset
 import torch
 from src.i18n import _
+from src.config import model_settings
+from src.speech.batching import MicroBatcher
+from src.speech.tts_cache import TTSCache
+from src.speech.speakers import SpeakerStore
+from src.speech.audio import TARGET_SAMPLE_RATE, load_audio, preprocess
+from src.speech.worker import InferenceClient
+from src.speech.backends import load_stt, load_tts
 
 from src.logger import CustomLogger
 LOGGER = CustomLogger(__name__)
@@ -25,9 +37,167 @@ models = {
     "tts": (r"./models/tts/Speecht5", "microsoft/speecht5_tts")
 }
 
-for key, (path, repo) in models.items():
-    LOGGER.info(f"Ensuring model exists at {path} for {key}...")
-    ensure_model_exists(path, repo)
+
+class ModelRegistry:
+    """
+    Lazily loads models on first use and tracks their readiness.
+
+    Loaders are registered by name and are only executed when the
+    model is requested through `get`/`aget` or warmed up explicitly
+    (e.g. from the FastAPI lifespan hook). Each model is loaded at most
+    once per process; concurrent callers wait for the same load.
+    """
+
+    def __init__(self):
+        self._loaders: dict[str, Callable[[], Any]] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._models: dict[str, Any] = {}
+        self._load_times: dict[str, float] = {}
+        self._errors: dict[str, str] = {}
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        self._loaders[name] = loader
+        self._locks[name] = threading.Lock()
+
+    def get(self, name: str) -> Any:
+        if name in self._models:
+            return self._models[name]
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model: {name}")
+
+        with self._locks[name]:
+            if name in self._models:
+                return self._models[name]
+            LOGGER.info("Loading model %s...", name)
+            start = time.perf_counter()
+            try:
+                model = self._loaders[name]()
+            except Exception as e:
+                self._errors[name] = str(e)
+                LOGGER.exception("Failed to load model %s: %s", name, e)
+                raise
+            self._load_times[name] = time.perf_counter() - start
+            self._errors.pop(name, None)
+            self._models[name] = model
+            LOGGER.info("Model %s loaded in %.2f s", name, self._load_times[name])
+            return model
+
+    async def aget(self, name: str) -> Any:
+        """Return a model, loading it in a worker thread if it is not loaded yet."""
+        if name in self._models:
+            return self._models[name]
+        return await asyncio.to_thread(self.get, name)
+
+    async def warmup(self, names: list[str] | None = None, retries: int = 5, backoff_s: float = 2.0,
+                     max_backoff_s: float = 60.0):
+        """
+        Load `names` up front, retrying failed loads with exponential backoff.
+
+        A transient failure (e.g. a hub timeout) then only delays readiness.
+        Models still failing after `retries` attempts stay unloaded until a
+        later `get`/`aget` loads them, which flips readiness as well.
+        """
+        pending = list(names or self._loaders)
+        delay = backoff_s
+        for attempt in range(retries + 1):
+            failed = []
+            for name in pending:
+                try:
+                    await self.aget(name)
+                except Exception:
+                    failed.append(name)  # already logged in `get`
+            if not failed:
+                return
+            if attempt < retries:
+                LOGGER.warning("Warm-up of %s failed, retrying in %.1f s (%d/%d)", failed, delay, attempt + 1, retries)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, max_backoff_s)
+            pending = failed
+        LOGGER.error("Warm-up of %s failed after %d retries; they load on first use", pending, retries)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def is_ready(self, names: list[str] | None = None) -> bool:
+        return all(self.is_loaded(name) for name in names or self._loaders)
+
+    def status(self) -> dict[str, dict[str, Any]]:
+        return {
+            name: {
+                "loaded": self.is_loaded(name),
+                "load_time_s": self._load_times.get(name),
+                "error": self._errors.get(name),
+            }
+            for name in self._loaders
+        }
+
+
+def __load_transcriber__():
+    ensure_model_exists(*models["stt"])
+    return load_stt(models["stt"][0], model_settings.STT_BACKEND)
+
+def __load_tts_processor__():
+    ensure_model_exists(*models["tts"])
+    return SpeechT5Processor.from_pretrained(models["tts"][0])
+
+def __load_tts_model__():
+    ensure_model_exists(*models["tts"])
+    return load_tts(models["tts"][0], model_settings.TTS_BACKEND)
+
+def __load_vocoder__():
+    return SpeechT5HifiGan.from_pretrained("microsoft/speecht5_hifigan")
+
+def __load_speaker_embeddings__():
+    return SpeakerStore(model_settings.SPEAKER_STORE_PATH).load()
+
+registry = ModelRegistry()
+registry.register("stt", __load_transcriber__)
+registry.register("tts_processor", __load_tts_processor__)
+registry.register("tts", __load_tts_model__)
+registry.register("vocoder", __load_vocoder__)
+registry.register("speaker_embeddings", __load_speaker_embeddings__)
+
+def __transcribe_batch__(items: list[dict]) -> list[str]:
+    transcriber_model = registry.get("stt")
+    outputs = transcriber_model(items, batch_size=len(items))
+    return [str(output["text"]) for output in outputs]
+
+stt_batcher = MicroBatcher(
+    __transcribe_batch__,
+    max_batch_size=model_settings.STT_MAX_BATCH_SIZE,
+    max_wait_ms=model_settings.STT_MAX_WAIT_MS,
+)
+
+inference_client = InferenceClient(model_settings.INFERENCE_SOCKET)
+
+def __use_worker__() -> bool:
+    return model_settings.INFERENCE_MODE == "worker"
+
+async def __transcribe__(audio: np.ndarray, sample_rate: int) -> str:
+    """Transcribe preprocessed audio through the local batcher or the shared inference worker."""
+    if __use_worker__():
+        return await inference_client.transcribe(audio, sample_rate)
+    await registry.aget("stt")
+    return await stt_batcher.submit({"raw": audio, "sampling_rate": sample_rate})
+
+async def models_status() -> tuple[bool, dict]:
+    """Readiness of the warm-up models, wherever they are loaded."""
+    if not __use_worker__():
+        return registry.is_ready(model_settings.WARMUP_MODELS), registry.status()
+    try:
+        status = await inference_client.status()
+    except (OSError, EOFError) as e:
+        return False, {"worker": {"loaded": False, "error": str(e)}}
+    return status.get("ready", False), status.get("models", {})
+
+async def tts_cache_stats() -> dict:
+    if not __use_worker__():
+        return tts_cache.stats()
+    try:
+        status = await inference_client.status()
+    except (OSError, EOFError) as e:
+        return {"error": str(e)}
+    return status.get("tts_cache", {})
 
 # tokenizer = AutoTokenizer.from_pretrained(models["nlp"][0])
 # LOGGER.info(f"Tokenizer loaded from {models['nlp'][0]}")
@@ -39,17 +209,6 @@ for key, (path, repo) in models.items():
 # )
 # LOGGER.info(f"Model loaded from {models['nlp'][0]}")
 
-transcriber_model = pipeline("automatic-speech-recognition", model=models["stt"][0])
-LOGGER.info(f"Transcriber model loaded from {models['stt'][0]}")
-
-processor = SpeechT5Processor.from_pretrained(models["tts"][0])
-model_speech = SpeechT5ForTextToSpeech.from_pretrained(models["tts"][0])
-vocoder = SpeechT5HifiGan.from_pretrained("microsoft/speecht5_hifigan")
-
-embeddings_dataset = load_dataset("Matthijs/cmu-arctic-xvectors", split="validation")
-speaker_embeddings = torch.tensor(embeddings_dataset[7306]["xvector"]).unsqueeze(0)
-LOGGER.info(f"Text-to-speech model loaded from {models['tts'][0]}")
-
 
 # async def __bot_output__(history):
 #     try:
@@ -77,28 +236,190 @@ LOGGER.info(f"Text-to-speech model loaded from {models['tts'][0]}")
 
 async def __audiofile_to_text__(wav_path):
     try:
-        audio_data, sample_rate = await asyncio.to_thread(sf.read, wav_path)
+        audio_data, has_signal = await asyncio.to_thread(load_audio, wav_path)
+        if not has_signal:
+            LOGGER.info("Skipping transcription of silent clip %s", wav_path)
+            return ""
 
-        audio_data = np.array(audio_data, dtype=np.float32)
-        audio_data /= np.max(np.abs(audio_data))
+        return await __transcribe__(audio_data, TARGET_SAMPLE_RATE)
+    
+    except Exception as e:
+        raise gr.Error(_("Failed to transcribe audio: {e}").format(e=e))
 
-        transcribed_text = await asyncio.to_thread(transcriber_model, {"raw": audio_data, "sampling_rate": sample_rate})
+def __merge_overlap__(transcript: str, text: str, max_words: int = 20) -> str:
+    """Append `text` to `transcript`, dropping words repeated by the overlapping audio window."""
+    previous, current = transcript.split(), text.split()
+    normalize = lambda word: word.strip(".,!?;:\"'").lower()
+    for size in range(min(max_words, len(previous), len(current)), 0, -1):
+        if [normalize(w) for w in previous[-size:]] == [normalize(w) for w in current[:size]]:
+            current = current[size:]
+            break
+    return " ".join(previous + current)
 
-        return str(transcribed_text["text"])
-    
+async def __stream_audiofile_to_text__(wav_path):
+    """
+    Transcribe an audio file window by window, yielding the growing transcript.
+
+    The file is read in overlapping blocks of `STT_STREAM_WINDOW_S` seconds,
+    so only one window is held in memory and the first partial transcript
+    is available after the first window instead of after the whole file.
+    """
+    try:
+        info = await asyncio.to_thread(sf.info, wav_path)
+        sample_rate = info.samplerate
+        blocks = sf.blocks(
+            wav_path,
+            blocksize=int(model_settings.STT_STREAM_WINDOW_S * sample_rate),
+            overlap=int(model_settings.STT_STREAM_OVERLAP_S * sample_rate),
+            dtype="float32",
+        )
     except Exception as e:
         raise gr.Error(_("Failed to transcribe audio: {e}").format(e=e))
 
-async def __text_to_audiofile__(history):
+    def next_window():
+        block = next(blocks, None)
+        return None if block is None else preprocess(block, sample_rate)
+
+    transcript = ""
     try:
-        input_text = history[-1]["content"]
-        inputs = processor(text=input_text, return_tensors="pt")
+        while True:
+            window = await asyncio.to_thread(next_window)
+            if window is None:
+                break
+            block, has_signal = window
+            if not has_signal:
+                continue
+
+            text = await __transcribe__(block, TARGET_SAMPLE_RATE)
+            transcript = __merge_overlap__(transcript, text)
+            LOGGER.debug("Partial transcript of %s: %d chars", wav_path, len(transcript))
+            yield transcript
+    except Exception as e:
+        raise gr.Error(_("Failed to transcribe audio: {e}").format(e=e))
+    finally:
+        blocks.close()
+
+TTS_SAMPLE_RATE = 16000
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+def __split_sentences__(text: str, max_chars: int = 300) -> list[str]:
+    """Split text into sentences, breaking overly long ones on whitespace to stay within SpeechT5 limits."""
+    sentences = []
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        sentence = sentence.strip()
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            sentences.append(sentence[:cut])
+            sentence = sentence[cut:].strip()
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+def __speaker_embedding__(speaker_id: int | None = None) -> torch.Tensor:
+    """Resolve a voice id, e.g. the `voice` entry of `UserSettings.settings`, to its embedding."""
+    speakers = registry.get("speaker_embeddings")
+    if speaker_id is not None and not 0 <= int(speaker_id) < len(speakers):
+        LOGGER.warning("Unknown speaker id %s, using the default voice", speaker_id)
+        speaker_id = None
+    return speakers.get(model_settings.DEFAULT_SPEAKER_ID if speaker_id is None else int(speaker_id))
+
+async def __user_speaker_id__(user_id) -> int | None:
+    """The `voice` a user picked in their settings, or None for the default voice."""
+    if user_id is None:
+        return None
+    from src.user_settings import settings_service
+    try:
+        stored, _etag = await settings_service.get(user_id)
+    except Exception as e:
+        LOGGER.warning("Failed to read the voice of user %s: %s", user_id, e)
+        return None
+    try:
+        return None if stored.get("voice") is None else int(stored["voice"])
+    except (TypeError, ValueError):
+        return None
+
+def __synthesize__(text: str, speaker_embeddings: torch.Tensor) -> np.ndarray:
+    processor = registry.get("tts_processor")
+    model_speech = registry.get("tts")
+    vocoder = registry.get("vocoder")
+    inputs = processor(text=text, return_tensors="pt")
+    with torch.inference_mode():
         speech = model_speech.generate_speech(inputs["input_ids"], speaker_embeddings, vocoder=vocoder)
-        speech = speech.numpy()
-        sf.write(r"/src/data/audio/bark_out.wav", speech.numpy(), samplerate=16000)
+    return speech.numpy()
+
+tts_cache = TTSCache(
+    memory_max_bytes=model_settings.TTS_CACHE_MEMORY_MB * 1024 * 1024,
+    disk_dir=model_settings.TTS_CACHE_DIR,
+    disk_max_bytes=model_settings.TTS_CACHE_DISK_MB * 1024 * 1024,
+)
+
+def __encode_wav__(speech: np.ndarray, sample_rate: int = TTS_SAMPLE_RATE) -> bytes:
+    buffer = io.BytesIO()
+    sf.write(buffer, speech, samplerate=sample_rate, format="WAV")
+    return buffer.getvalue()
+
+async def __stream_text_to_audio__(text: str, speaker_id: int | None = None, user_id=None) -> AsyncIterator[np.ndarray]:
+    """
+    Synthesize `text` sentence by sentence, yielding each waveform as soon as it is ready.
+
+    Without an explicit `speaker_id`, the voice of `user_id` is used.
+    Sentences found in `tts_cache` are returned without running the model.
+    """
+    if speaker_id is None:
+        speaker_id = await __user_speaker_id__(user_id)
+    if __use_worker__():
+        async for speech in inference_client.synthesize(text, speaker_id):
+            yield speech
+        return
+
+    await registry.aget("speaker_embeddings")
+    speaker_embeddings = __speaker_embedding__(speaker_id)
+    for sentence in __split_sentences__(text):
+        key = TTSCache.make_key(sentence, speaker_embeddings, f"{models['tts'][1]}:{model_settings.TTS_BACKEND}")
+        speech = await tts_cache.aget(key)
+        if speech is None:
+            LOGGER.debug("Synthesizing sentence of %d chars", len(sentence))
+            speech = await asyncio.to_thread(__synthesize__, sentence, speaker_embeddings)
+            await tts_cache.aput(key, speech)
+        yield speech
+
+def __wav_stream_header__(sample_rate: int = TTS_SAMPLE_RATE) -> bytes:
+    """16-bit mono WAV header with open-ended sizes, for a stream whose length is not known up front."""
+    unknown = 0xFFFFFFFF
+    return (
+        b"RIFF" + struct.pack("<I", unknown) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+        + b"data" + struct.pack("<I", unknown)
+    )
+
+async def text_to_wav_stream(text: str, speaker_id: int | None = None, user_id=None) -> AsyncIterator[bytes]:
+    """
+    Yield one continuous WAV stream for `text`, one PCM chunk per sentence.
+
+    Used by the HTTP TTS endpoint: the header goes out first, so a client
+    starts playback after the first sentence instead of after the whole text.
+    """
+    yield __wav_stream_header__()
+    async for speech in __stream_text_to_audio__(text, speaker_id, user_id):
+        yield (np.clip(speech, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+async def __text_to_audio_stream__(text: str, speaker_id: int | None = None, user_id=None) -> AsyncIterator[bytes]:
+    """Yield in-memory WAV chunks for a streaming `gr.Audio` output; playback starts after the first sentence."""
+    try:
+        async for speech in __stream_text_to_audio__(text, speaker_id, user_id):
+            yield __encode_wav__(speech)
+    except Exception as e:
+        raise gr.Error(_("Failed to convert text to audio: {e}").format(e=e))
+
+async def __text_to_audiofile__(history, speaker_id: int | None = None, user_id=None):
+    try:
+        input_text = history[-1]["content"]
+        chunks = [speech async for speech in __stream_text_to_audio__(input_text, speaker_id, user_id)]
+        speech = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
         history.append(gr.ChatMessage(
             role="assistant",
-            content=gr.Audio(r"/src/data/audio\bark_out.wav"),
+            content=gr.Audio((TTS_SAMPLE_RATE, speech)),
             metadata={"title": rf"🛠️ Used tool {models['tts'][0]}"}
         ))
         return history
@@ -0,0 +1,174 @@
+import os
+import json
+import asyncio
+from typing import Any, Callable
+
+from src.logger import CustomLogger
+LOGGER = CustomLogger(__name__)
+
+Handler = Callable[[str, Any], None]
+MAX_FRAME_SIZE = 1024 * 1024
+MAX_CLIENT_BUFFER = 16 * 1024 * 1024
+
+class PubSubBackend:
+    """
+    Delivers published messages to the handler of every subscribed process.
+
+    The publishing process receives its own messages through the same path
+    as everybody else, so callers deliver locally only via the handler.
+    Messages must be JSON-serializable.
+    """
+
+    async def start(self, handler: Handler):
+        raise NotImplementedError
+
+    def publish(self, channel: str, message: Any):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class InProcessPubSub(PubSubBackend):
+    """Single-process backend: publishing calls the handler directly."""
+
+    def __init__(self):
+        self._handler: Handler | None = None
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+
+    def publish(self, channel: str, message: Any):
+        if self._handler is not None:
+            self._handler(channel, message)
+
+
+class UnixSocketPubSub(PubSubBackend):
+    """
+    Cross-process backend talking to a `PubSubBroker` over a Unix socket.
+
+    Frames are newline-delimited JSON. The connection is re-established in
+    the background if the broker restarts; while it is down, messages are
+    delivered to this process only. Malformed frames are logged and
+    skipped. `publish` does not wait for the broker: while more than
+    `MAX_CLIENT_BUFFER` bytes are waiting to be sent, new messages are
+    dropped instead of buffered without bound.
+
+    Args:
+        path (str): Unix socket the broker listens on.
+        reconnect_delay (float): Seconds between connection attempts.
+    """
+
+    def __init__(self, path: str, reconnect_delay: float = 1.0):
+        self.path = path
+        self.reconnect_delay = reconnect_delay
+        self._handler: Handler | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._task: asyncio.Task | None = None
+        self.dropped = 0
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+        self._task = asyncio.create_task(self.__run__())
+
+    def __dispatch__(self, channel: str, message: Any):
+        try:
+            self._handler(channel, message)
+        except Exception as e:
+            LOGGER.exception("Pub/sub handler failed for %s: %s", channel, e)
+
+    async def __run__(self):
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=MAX_FRAME_SIZE)
+                self._writer = writer
+                LOGGER.info("Connected to pub/sub broker at %s", self.path)
+                while line := await reader.readline():
+                    try:
+                        frame = json.loads(line)
+                        channel, message = frame["channel"], frame["message"]
+                    except (ValueError, KeyError, TypeError) as e:
+                        LOGGER.warning("Skipping malformed pub/sub frame: %r", e, extra={"rate_key": "pubsub-frame"})
+                        continue
+                    self.__dispatch__(channel, message)
+                LOGGER.warning("Pub/sub broker closed the connection")
+            except (OSError, ValueError) as e:
+                LOGGER.warning("Pub/sub broker unavailable at %s: %s", self.path, e)
+            except Exception as e:
+                LOGGER.exception("Pub/sub reader failed, reconnecting: %s", e)
+            finally:
+                if self._writer is not None:
+                    self._writer.close()
+                self._writer = None
+            await asyncio.sleep(self.reconnect_delay)
+
+    def publish(self, channel: str, message: Any):
+        if self._writer is None or self._writer.is_closing():
+            self.__dispatch__(channel, message)
+            return
+        if self._writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            self.dropped += 1
+            LOGGER.warning("Pub/sub broker is not keeping up, dropping message for %s", channel,
+                           extra={"rate_key": "pubsub-backlog"})
+            return
+        self._writer.write(json.dumps({"channel": channel, "message": message}).encode() + b"\n")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+
+class PubSubBroker:
+    """Relays every frame received from any client to all connected clients."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.clients: set[asyncio.StreamWriter] = set()
+
+    def __relay__(self, line: bytes):
+        for client in list(self.clients):
+            if client.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+                LOGGER.warning("Dropping pub/sub client that stopped reading")
+                self.clients.discard(client)
+                client.close()
+                continue
+            client.write(line)
+
+    async def __handle__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.clients.add(writer)
+        LOGGER.info("Pub/sub client connected (%d total)", len(self.clients))
+        try:
+            while line := await reader.readline():
+                self.__relay__(line)
+        except (OSError, ValueError) as e:
+            LOGGER.warning("Pub/sub client failed: %s", e)
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    async def serve(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        server = await asyncio.start_unix_server(self.__handle__, path=self.path, limit=MAX_FRAME_SIZE)
+        LOGGER.info("Pub/sub broker %d listening on %s", os.getpid(), self.path)
+        async with server:
+            await server.serve_forever()
+
+
+def create_backend(kind: str, path: str) -> PubSubBackend:
+    if kind == "memory":
+        return InProcessPubSub()
+    if kind == "unix":
+        return UnixSocketPubSub(path)
+    raise ValueError(f"Unknown pub/sub backend: {kind}")
+
+def run_broker():
+    """Process entry point: relay pub/sub frames until terminated."""
+    from src.config import chat_settings
+    asyncio.run(PubSubBroker(chat_settings.PUBSUB_SOCKET).serve())
+
+
+if __name__ == "__main__":
+    run_broker()
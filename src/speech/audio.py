@@ -0,0 +1,65 @@
+import os
+from functools import lru_cache
+import numpy as np
+import soundfile as sf
+import torch
+import torch.nn.functional as F
+
+TARGET_SAMPLE_RATE = 16000
+SUPPORTED_AUDIO_EXTENSIONS = frozenset(
+    {f".{name.lower()}" for name in sf.available_formats() if name != "RAW"} | {".aif", ".oga", ".opus"}
+)
+
+def is_audio_file(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in SUPPORTED_AUDIO_EXTENSIONS
+
+def to_mono(audio: np.ndarray) -> np.ndarray:
+    if audio.ndim == 1:
+        return audio
+    return audio.mean(axis=1, dtype=np.float32)
+
+def normalize_(audio: np.ndarray) -> bool:
+    """Peak-normalize `audio` in place. Returns False (leaving it untouched) for silent clips."""
+    if audio.size == 0:
+        return False
+    peak = max(float(audio.max()), -float(audio.min()))
+    if peak == 0 or not np.isfinite(peak):
+        return False
+    audio *= 1.0 / peak
+    return True
+
+@lru_cache(maxsize=16)
+def __lowpass_kernel__(orig_sr: int, target_sr: int, taps: int = 63) -> torch.Tensor:
+    """Hann-windowed sinc anti-aliasing filter for downsampling from `orig_sr` to `target_sr`."""
+    cutoff = 0.475 * target_sr / orig_sr  # slightly below the new Nyquist, in cycles per sample
+    n = torch.arange(taps, dtype=torch.float32) - (taps - 1) / 2
+    kernel = 2 * cutoff * torch.sinc(2 * cutoff * n) * torch.hann_window(taps, periodic=False)
+    return (kernel / kernel.sum()).view(1, 1, -1)
+
+def resample(audio: np.ndarray, orig_sr: int, target_sr: int = TARGET_SAMPLE_RATE) -> np.ndarray:
+    """Resample a mono float32 signal, returning `audio` itself when the rates already match."""
+    if orig_sr == target_sr or audio.size == 0:
+        return audio
+    signal = torch.from_numpy(np.ascontiguousarray(audio)).view(1, 1, -1)
+    size = max(1, round(audio.shape[0] * target_sr / orig_sr))
+    with torch.inference_mode():
+        if target_sr < orig_sr:
+            kernel = __lowpass_kernel__(orig_sr, target_sr)
+            signal = F.conv1d(signal, kernel, padding=kernel.shape[-1] // 2)
+        signal = F.interpolate(signal, size=size, mode="linear", align_corners=False)
+    return signal.view(-1).numpy()
+
+def preprocess(audio: np.ndarray, sample_rate: int) -> tuple[np.ndarray, bool]:
+    """
+    Bring decoded float32 audio to mono 16 kHz and peak-normalize it in place.
+
+    Returns the processed signal and whether it contains any signal at all.
+    Already mono 16 kHz input is normalized without being copied.
+    """
+    audio = resample(to_mono(audio), sample_rate)
+    return audio, normalize_(audio)
+
+def load_audio(path: str) -> tuple[np.ndarray, bool]:
+    """Decode an audio file straight to float32 and `preprocess` it."""
+    audio, sample_rate = sf.read(path, dtype="float32")
+    return preprocess(audio, sample_rate)
@@ -0,0 +1,63 @@
+import os
+import torch
+from transformers import AutoProcessor, SpeechT5ForTextToSpeech, pipeline
+
+from src.logger import CustomLogger
+LOGGER = CustomLogger(__name__)
+
+STT_BACKENDS = ("torch", "int8", "onnx")
+TTS_BACKENDS = ("torch", "int8")
+
+def quantize_int8(module: torch.nn.Module) -> torch.nn.Module:
+    """Dynamically quantize the Linear layers of `module` to int8 for CPU inference."""
+    return torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+
+def __load_onnx_stt__(model_path: str):
+    try:
+        from optimum.onnxruntime import ORTModelForSpeechSeq2Seq
+    except ImportError as e:
+        raise ImportError("The onnx STT backend needs `pip install optimum[onnxruntime]`") from e
+
+    onnx_path = f"{model_path}-onnx"
+    if os.path.exists(onnx_path):
+        model = ORTModelForSpeechSeq2Seq.from_pretrained(onnx_path)
+    else:
+        LOGGER.warning("Exporting %s to ONNX at %s, this runs once...", model_path, onnx_path)
+        model = ORTModelForSpeechSeq2Seq.from_pretrained(model_path, export=True)
+        model.save_pretrained(onnx_path)
+    processor = AutoProcessor.from_pretrained(model_path)
+    return pipeline(
+        "automatic-speech-recognition",
+        model=model,
+        tokenizer=processor.tokenizer,
+        feature_extractor=processor.feature_extractor,
+    )
+
+def load_stt(model_path: str, backend: str = "torch"):
+    """
+    Build the speech recognition pipeline for `backend`.
+
+    Args:
+        model_path (str): Local checkpoint directory.
+        backend (str): "torch" (full precision), "int8" (dynamically
+            quantized PyTorch) or "onnx" (ONNX Runtime through optimum).
+    """
+    if backend not in STT_BACKENDS:
+        raise ValueError(f"Unknown STT backend {backend!r}, expected one of {STT_BACKENDS}")
+    if backend == "onnx":
+        return __load_onnx_stt__(model_path)
+
+    transcriber = pipeline("automatic-speech-recognition", model=model_path)
+    if backend == "int8":
+        transcriber.model = quantize_int8(transcriber.model)
+    return transcriber
+
+def load_tts(model_path: str, backend: str = "torch") -> SpeechT5ForTextToSpeech:
+    """Load SpeechT5 for `backend`; ONNX export of its autoregressive decoder is not supported."""
+    if backend not in TTS_BACKENDS:
+        raise ValueError(f"Unknown TTS backend {backend!r}, expected one of {TTS_BACKENDS}")
+
+    model = SpeechT5ForTextToSpeech.from_pretrained(model_path)
+    if backend == "int8":
+        model = quantize_int8(model)
+    return model
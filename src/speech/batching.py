@@ -0,0 +1,99 @@
+import asyncio
+from typing import Any, Callable
+
+from src.logger import CustomLogger
+LOGGER = CustomLogger(__name__)
+
+class MicroBatcher:
+    """
+    Gathers concurrent requests into small batches for a blocking model call.
+
+    Callers `submit` one item and await its result. A background task
+    takes the first queued item, waits at most `max_wait_ms` for more
+    (up to `max_batch_size`), runs `run_batch` once in a worker thread
+    and resolves each caller's future with its own result.
+
+    Args:
+        run_batch (Callable[[list], list]): Blocking function mapping a list
+            of items to a list of results in the same order.
+        max_batch_size (int): Upper bound on items per batch.
+        max_wait_ms (float): How long the first item may wait for company.
+    """
+
+    def __init__(self, run_batch: Callable[[list], list], max_batch_size: int = 8, max_wait_ms: float = 20.0):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self._queue: asyncio.Queue | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._worker: asyncio.Task | None = None
+
+    def __ensure_worker__(self):
+        if self._worker is not None and not self._worker.done():
+            return
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._queue = asyncio.Queue()
+            self._loop = loop
+        elif self._worker is not None and not self._worker.cancelled() and self._worker.exception() is not None:
+            # Items still queued are served by the restarted task
+            LOGGER.error("Batch worker died, restarting: %s", self._worker.exception())
+        self._worker = asyncio.create_task(self.__run__())
+
+    async def submit(self, item: Any) -> Any:
+        self.__ensure_worker__()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def __collect__(self) -> list[tuple[Any, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def __run__(self):
+        while True:
+            batch = await self.__collect__()
+            pending = [(item, future) for item, future in batch if not future.cancelled()]
+            if not pending:
+                continue
+            items = [item for item, _ in pending]
+            LOGGER.debug("Running batch of %d item(s)", len(items))
+            try:
+                results = await asyncio.to_thread(self.run_batch, items)
+            except asyncio.CancelledError:
+                for _, future in pending:
+                    future.cancel()
+                raise
+            except Exception as e:
+                LOGGER.error("Batch of %d item(s) failed: %s", len(items), e)
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            if len(results) != len(pending):
+                error = RuntimeError(f"Batch returned {len(results)} result(s) for {len(pending)} item(s)")
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            for (_, future), result in zip(pending, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        # Callers still waiting would otherwise never be resolved
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
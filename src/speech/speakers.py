@@ -0,0 +1,65 @@
+import os
+import threading
+import numpy as np
+import torch
+
+from src.logger import CustomLogger
+LOGGER = CustomLogger(__name__)
+
+class SpeakerStore:
+    """
+    Memory-mapped matrix of x-vector speaker embeddings.
+
+    The store is a single float32 `.npy` file with one row per speaker,
+    built once from the `cmu-arctic-xvectors` dataset. Opening it only
+    maps the file, and rows are paged in when a voice is first used.
+
+    Args:
+        path (str): Location of the `.npy` file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._embeddings: np.ndarray | None = None
+        self._tensors: dict[int, torch.Tensor] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def build(path: str, repo_id: str = "Matthijs/cmu-arctic-xvectors", split: str = "validation"):
+        from datasets import load_dataset
+
+        LOGGER.info("Building speaker store %s from %s...", path, repo_id)
+        dataset = load_dataset(repo_id, split=split)
+        embeddings = np.asarray(dataset["xvector"], dtype=np.float32)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            np.save(file, embeddings)
+        os.replace(tmp_path, path)
+        LOGGER.info("Speaker store built with %d voices", len(embeddings))
+
+    def load(self) -> "SpeakerStore":
+        if not os.path.exists(self.path):
+            self.build(self.path)
+        self._embeddings = np.load(self.path, mmap_mode="r")
+        LOGGER.info("Speaker store %s mapped with %d voices", self.path, len(self))
+        return self
+
+    def __len__(self) -> int:
+        return 0 if self._embeddings is None else self._embeddings.shape[0]
+
+    def get(self, speaker_id: int) -> torch.Tensor:
+        """Return the embedding of `speaker_id` as a (1, dim) tensor."""
+        if not 0 <= speaker_id < len(self):
+            raise ValueError(f"Unknown speaker id {speaker_id}, expected 0..{len(self) - 1}")
+        tensor = self._tensors.get(speaker_id)
+        if tensor is None:
+            with self._lock:
+                tensor = torch.from_numpy(np.array(self._embeddings[speaker_id])).unsqueeze(0)
+                self._tensors[speaker_id] = tensor
+        return tensor
+
+
+if __name__ == "__main__":
+    from src.config import model_settings
+    SpeakerStore.build(model_settings.SPEAKER_STORE_PATH)
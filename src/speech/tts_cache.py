@@ -0,0 +1,163 @@
+import os
+import asyncio
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+
+from src.logger import CustomLogger
+LOGGER = CustomLogger(__name__)
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized speech.
+
+    Entries are keyed on the normalized text, the speaker embedding and
+    the model id. Lookups go to a bounded in-memory LRU first and then to
+    a size-capped directory of `.npy` files; disk hits are promoted back
+    into memory. Both tiers evict least recently used entries first.
+
+    Args:
+        memory_max_bytes (int): Budget of the in-memory tier.
+        disk_dir (str): Directory of the on-disk tier.
+        disk_max_bytes (int): Budget of the on-disk tier, 0 disables it.
+    """
+
+    def __init__(self, memory_max_bytes: int, disk_dir: str, disk_max_bytes: int):
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        return " ".join(unicodedata.normalize("NFKC", text).split())
+
+    @classmethod
+    def make_key(cls, text: str, speaker_embedding, model_id: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(model_id.encode())
+        digest.update(b"\0")
+        digest.update(np.ascontiguousarray(speaker_embedding, dtype=np.float32).tobytes())
+        digest.update(b"\0")
+        digest.update(cls.normalize_text(text).encode())
+        return digest.hexdigest()
+
+    def __disk_path__(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.npy")
+
+    def __remember__(self, key: str, speech: np.ndarray):
+        if speech.nbytes > self.memory_max_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= previous.nbytes
+            self._memory[key] = speech
+            self._memory_bytes += speech.nbytes
+            while self._memory_bytes > self.memory_max_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted.nbytes
+
+    def get_memory(self, key: str) -> np.ndarray | None:
+        with self._lock:
+            speech = self._memory.get(key)
+            if speech is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            return speech
+
+    def get_disk(self, key: str) -> np.ndarray | None:
+        if not self.disk_max_bytes:
+            return None
+        path = self.__disk_path__(key)
+        try:
+            speech = np.load(path)
+            os.utime(path)  # mark as recently used for eviction
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        self.disk_hits += 1
+        self.__remember__(key, speech)
+        return speech
+
+    async def aget(self, key: str) -> np.ndarray | None:
+        speech = self.get_memory(key)
+        if speech is None:
+            speech = await asyncio.to_thread(self.get_disk, key)
+        if speech is None:
+            self.misses += 1
+        return speech
+
+    def put(self, key: str, speech: np.ndarray):
+        speech.setflags(write=False)
+        self.__remember__(key, speech)
+        if self.disk_max_bytes:
+            try:
+                self.__write_disk__(key, speech)
+            except OSError as e:
+                LOGGER.warning("Failed to write TTS cache entry %s: %s", key, e)
+
+    async def aput(self, key: str, speech: np.ndarray):
+        await asyncio.to_thread(self.put, key, speech)
+
+    def __write_disk__(self, key: str, speech: np.ndarray):
+        os.makedirs(self.disk_dir, exist_ok=True)
+        path = self.__disk_path__(key)
+        if os.path.exists(path):
+            return  # content-addressed: e.g. two concurrent misses for one sentence
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as file:
+            np.save(file, speech)
+        with self._lock:
+            # A racing writer may still have replaced it since the check above
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            if self._disk_bytes is None:
+                self._disk_bytes = self.__scan_disk__()[1]
+            else:
+                self._disk_bytes += os.path.getsize(path) - previous
+            over_budget = self._disk_bytes > self.disk_max_bytes
+        if over_budget:
+            self.__evict_disk__()
+
+    def __scan_disk__(self) -> tuple[list[os.DirEntry], int]:
+        entries = [entry for entry in os.scandir(self.disk_dir) if entry.name.endswith(".npy")]
+        return entries, sum(entry.stat().st_size for entry in entries)
+
+    def __evict_disk__(self):
+        """Delete least recently used files until the tier is back under 90% of its budget."""
+        entries, total = self.__scan_disk__()
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        target = int(self.disk_max_bytes * 0.9)
+        removed = 0
+        for entry in entries:
+            if total <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            self._disk_bytes = total
+        LOGGER.info("Evicted %d TTS cache file(s), disk tier now %d bytes", removed, total)
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes or 0,
+            }
@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import struct
+import asyncio
+from contextlib import aclosing
+from typing import Any, AsyncIterator
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+
+from src.logger import CustomLogger
+LOGGER = CustomLogger(__name__)
+
+FRAME_HEADER = struct.Struct("!I")
+
+async def __write_frame__(writer: asyncio.StreamWriter, message: dict):
+    payload = json.dumps(message).encode()
+    writer.write(FRAME_HEADER.pack(len(payload)) + payload)
+    await writer.drain()
+
+async def __read_frame__(reader: asyncio.StreamReader) -> dict:
+    header = await reader.readexactly(FRAME_HEADER.size)
+    (size,) = FRAME_HEADER.unpack(header)
+    return json.loads(await reader.readexactly(size))
+
+def __open_shm__(name: str | None = None, size: int = 0) -> SharedMemory:
+    """
+    Create (no `name`) or attach to a shared memory block outside of the resource tracker.
+
+    Every block of the protocol is unlinked explicitly by the receiving side,
+    so letting the tracker of either process clean it up as well only yields
+    spurious "leaked shared_memory" warnings.
+    """
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, create=name is None, size=size, track=False)
+    shm = SharedMemory(name=name, create=name is None, size=size)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+def __unlink_shm__(shm: SharedMemory):
+    shm.close()
+    if sys.version_info < (3, 13):
+        resource_tracker.register(shm._name, "shared_memory")  # balanced by `unlink`
+    shm.unlink()
+
+def __export_audio__(audio: np.ndarray) -> tuple[SharedMemory, dict]:
+    """Copy `audio` into a new shared memory block and describe it for the peer."""
+    shm = __open_shm__(size=max(1, audio.nbytes))
+    np.ndarray(audio.shape, dtype=audio.dtype, buffer=shm.buf)[...] = audio
+    return shm, {"shm": shm.name, "shape": list(audio.shape), "dtype": str(audio.dtype)}
+
+def __discard_shm__(name: str):
+    """Unlink an exported block unless the peer already did."""
+    try:
+        shm = __open_shm__(name)
+    except FileNotFoundError:
+        return
+    __unlink_shm__(shm)
+
+def __import_audio__(descriptor: dict) -> np.ndarray:
+    """Copy an audio block exported by the peer out of shared memory and unlink it."""
+    shm = __open_shm__(descriptor["shm"])
+    try:
+        view = np.ndarray(tuple(descriptor["shape"]), dtype=descriptor["dtype"], buffer=shm.buf)
+        audio = view.copy()
+        del view
+    finally:
+        __unlink_shm__(shm)
+    return audio
+
+
+class InferenceClient:
+    """
+    Talks to the shared inference worker over a local Unix socket.
+
+    Control messages are length-prefixed JSON frames; audio travels through
+    `multiprocessing.shared_memory` blocks so web workers never hold model
+    weights themselves.
+
+    Args:
+        path (str): Unix socket the worker listens on.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def __request__(self, message: dict) -> AsyncIterator[dict]:
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        try:
+            await __write_frame__(writer, message)
+            while True:
+                response = await __read_frame__(reader)
+                if "error" in response:
+                    raise RuntimeError(response["error"])
+                if response.get("done"):
+                    break
+                yield response
+        finally:
+            writer.close()
+
+    async def __call__(self, message: dict) -> dict:
+        async with aclosing(self.__request__(message)) as responses:
+            async for response in responses:
+                return response
+        return {}
+
+    async def status(self) -> dict[str, Any]:
+        return await self({"op": "status"})
+
+    async def transcribe(self, audio: np.ndarray, sample_rate: int) -> str:
+        shm, descriptor = __export_audio__(audio)
+        try:
+            response = await self({"op": "transcribe", "sampling_rate": sample_rate, **descriptor})
+            return response.get("text", "")
+        finally:
+            __unlink_shm__(shm)
+
+    async def synthesize(self, text: str, speaker_id: int | None = None) -> AsyncIterator[np.ndarray]:
+        """
+        Yield each synthesized sentence, unlinking its block as it is imported.
+
+        Stopping early closes the connection, which tells the worker to
+        unlink the frames that were exported but never imported.
+        """
+        request = {"op": "synthesize", "text": text, "speaker_id": speaker_id}
+        async with aclosing(self.__request__(request)) as responses:
+            async for response in responses:
+                yield __import_audio__(response)
+
+
+class InferenceWorker:
+    """Owns the models and serves `InferenceClient` requests from every web worker."""
+
+    RELEASE_TIMEOUT_S = 30.0
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def __release__(self, reader: asyncio.StreamReader, exported: list[str]):
+        """
+        Wait for the client to hang up, after which it will not import any more blocks.
+
+        Blocks it did not import (it stopped early or failed) are then
+        unlinked by the `finally` of `__handle__`.
+        """
+        if not exported:
+            return
+        try:
+            await asyncio.wait_for(reader.read(), self.RELEASE_TIMEOUT_S)
+        except (asyncio.TimeoutError, OSError):
+            pass
+
+    async def __handle__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        from src import model
+
+        exported: list[str] = []
+        try:
+            request = await __read_frame__(reader)
+            op = request.get("op")
+            if op == "status":
+                await __write_frame__(writer, {
+                    "ready": model.registry.is_ready(model.model_settings.WARMUP_MODELS),
+                    "models": model.registry.status(),
+                    "tts_cache": model.tts_cache.stats(),
+                })
+            elif op == "transcribe":
+                shm = __open_shm__(request["shm"])
+                audio = np.ndarray(tuple(request["shape"]), dtype=request["dtype"], buffer=shm.buf)
+                try:
+                    text = await model.__transcribe__(audio, request["sampling_rate"])
+                finally:
+                    del audio
+                    shm.close()
+                await __write_frame__(writer, {"text": text})
+            elif op == "synthesize":
+                async for speech in model.__stream_text_to_audio__(request["text"], request.get("speaker_id")):
+                    shm, descriptor = __export_audio__(speech)
+                    exported.append(shm.name)
+                    shm.close()
+                    await __write_frame__(writer, descriptor)
+            else:
+                raise ValueError(f"Unknown op: {op}")
+            await __write_frame__(writer, {"done": True})
+            await self.__release__(reader, exported)
+        except asyncio.IncompleteReadError:
+            pass
+        except Exception as e:
+            LOGGER.exception("Inference request failed: %s", e)
+            try:
+                await __write_frame__(writer, {"error": str(e)})
+            except Exception:
+                pass
+            await self.__release__(reader, exported)
+        finally:
+            writer.close()
+            # Unlinked here on cancellation and failed writes too; blocks are not tracked by the resource tracker
+            for name in exported:
+                __discard_shm__(name)
+
+    async def serve(self, warmup: list[str] | None = None):
+        from src.config import model_settings
+        from src.model import registry
+
+        model_settings.INFERENCE_MODE = "local"  # this process is the one running the models
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        server = await asyncio.start_unix_server(self.__handle__, path=self.path)
+        LOGGER.info("Inference worker %d listening on %s", os.getpid(), self.path)
+        # Requests are served while warm-up (and its retries) runs; they load what they need
+        warmup_task = asyncio.create_task(
+            registry.warmup(warmup, model_settings.WARMUP_RETRIES, model_settings.WARMUP_BACKOFF_S)
+        )
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            warmup_task.cancel()
+
+
+def run_worker():
+    """Process entry point: serve inference requests until terminated."""
+    from src.config import model_settings
+    asyncio.run(InferenceWorker(model_settings.INFERENCE_SOCKET).serve(model_settings.WARMUP_MODELS))
+
+
+if __name__ == "__main__":
+    run_worker()
@@ -0,0 +1,141 @@
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any
+from sqlalchemy import select, update
+
+from src.config import prod_settings
+from src.database import async_session_maker
+
+from src.logger import CustomLogger
+LOGGER = CustomLogger(__name__)
+
+class SettingsConflict(Exception):
+    """The stored settings no longer match the ETag the client based its write on."""
+
+def make_etag(settings: dict) -> str:
+    canonical = json.dumps(settings, sort_keys=True, separators=(",", ":"), default=str)
+    return f'"{hashlib.sha256(canonical.encode()).hexdigest()[:32]}"'
+
+class SettingsService:
+    """
+    Per-user settings with a TTL read cache in front of the database.
+
+    Reads within `ttl` of the last load or write are served from memory.
+    Writes go to the database and replace the cached entry, so a user
+    always reads their own writes on this worker; other workers see the
+    change once their entry expires, which bounds staleness to `ttl`.
+    Each value carries an ETag for conditional requests.
+
+    Args:
+        session_maker: Factory of `AsyncSession`s.
+        ttl (float): Seconds a cached entry is served.
+        max_entries (int): Number of users kept in the cache.
+    """
+
+    def __init__(self, session_maker, ttl: float = 60.0, max_entries: int = 10000):
+        self.session_maker = session_maker
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache: OrderedDict[uuid.UUID, tuple[float, dict, str]] = OrderedDict()
+        self._loads: dict[uuid.UUID, tuple[asyncio.Future, int]] = {}
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __remember__(self, user_id: uuid.UUID, settings: dict) -> tuple[dict, str]:
+        etag = make_etag(settings)
+        self._cache[user_id] = (time.monotonic() + self.ttl, settings, etag)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return settings, etag
+
+    def invalidate(self, user_id: uuid.UUID):
+        self._cache.pop(user_id, None)
+
+    async def __load__(self, user_id: uuid.UUID) -> dict:
+        from src.auth.models import User, UserSettings
+        async with self.session_maker() as session:
+            settings = await session.scalar(
+                select(UserSettings.settings)
+                .join(User, User.user_settings == UserSettings.id)
+                .where(User.id == user_id)
+            )
+        return settings or {}
+
+    async def get(self, user_id: uuid.UUID) -> tuple[dict, str]:
+        """Return the user's settings and their ETag."""
+        entry = self._cache.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._cache.move_to_end(user_id)
+            self.hits += 1
+            return entry[1], entry[2]
+        self.misses += 1
+        # Concurrent misses for one user share a single query
+        if user_id not in self._loads:
+            load = asyncio.ensure_future(self.__load__(user_id))
+            self._loads[user_id] = (load, self._writes)
+            load.add_done_callback(lambda _: self._loads.pop(user_id, None))
+        load, writes = self._loads[user_id]
+        settings = await asyncio.shield(load)
+        if writes != self._writes:
+            # A write landed while loading; do not cache what may be the older value
+            return settings, make_etag(settings)
+        return self.__remember__(user_id, settings)
+
+    async def __write__(self, user_id: uuid.UUID, changes: dict, replace: bool, if_match: str | None) -> tuple[dict, str]:
+        from src.auth.models import User, UserSettings
+        async with self.session_maker() as session:
+            row = (await session.execute(
+                select(User.user_settings, UserSettings.id, UserSettings.settings)
+                .outerjoin(UserSettings, User.user_settings == UserSettings.id)
+                .where(User.id == user_id)
+                .with_for_update(of=User)
+            )).first()
+            if row is None:
+                raise LookupError(f"User {user_id} not found")
+            settings_id, stored_id, stored = row
+            current = stored or {}
+            if if_match is not None and if_match != "*" and if_match != make_etag(current):
+                raise SettingsConflict()
+            if replace:
+                settings = dict(changes)
+            else:
+                # JSON merge patch: null removes a key
+                settings = {**current, **changes}
+                settings = {key: value for key, value in settings.items() if value is not None}
+            if settings_id is None:
+                settings_id = uuid.uuid4()
+                session.add(UserSettings(id=settings_id, settings=settings))
+                await session.flush()
+                await session.execute(update(User).where(User.id == user_id).values(user_settings=settings_id))
+                LOGGER.warning("User settings not found for user %s, creating new settings", user_id)
+            elif stored_id is None:
+                session.add(UserSettings(id=settings_id, settings=settings))
+                LOGGER.warning("User settings not found for user %s, creating new settings", user_id)
+            else:
+                await session.execute(update(UserSettings).where(UserSettings.id == settings_id).values(settings=settings))
+            await session.commit()
+        self._writes += 1
+        LOGGER.info("Settings of user %s %s", user_id, "replaced" if replace else "updated")
+        return self.__remember__(user_id, settings)
+
+    async def put(self, user_id: uuid.UUID, settings: dict, if_match: str | None = None) -> tuple[dict, str]:
+        return await self.__write__(user_id, settings, True, if_match)
+
+    async def patch(self, user_id: uuid.UUID, changes: dict, if_match: str | None = None) -> tuple[dict, str]:
+        return await self.__write__(user_id, changes, False, if_match)
+
+    def stats(self) -> dict[str, Any]:
+        return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+settings_service = SettingsService(
+    async_session_maker,
+    ttl=prod_settings.USER_SETTINGS_CACHE_TTL_S,
+    max_entries=prod_settings.USER_SETTINGS_CACHE_SIZE,
+)
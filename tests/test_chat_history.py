@@ -0,0 +1,49 @@
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.auth.base_config import current_active_user
+from src.chat_history import router_chat
+from src.chat_store import chat_session_id
+from src.database import get_async_session
+
+
+class FakeRow(SimpleNamespace):
+    def _asdict(self):
+        return vars(self)
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+class FakeSession:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def execute(self, query):
+        return FakeResult(self.rows)
+
+
+def test_list_sessions_accepts_chat_session_ids():
+    user = SimpleNamespace(id=uuid.uuid4())
+    session_id = chat_session_id(user.id, "browser-tab")
+    created_at = datetime(2025, 7, 2, 12, 0, tzinfo=timezone.utc)
+    rows = [FakeRow(id=session_id, agent_id="chat", created_at=created_at)]
+
+    app = FastAPI()
+    app.include_router(router_chat)
+    app.dependency_overrides[current_active_user] = lambda: user
+    app.dependency_overrides[get_async_session] = lambda: FakeSession(rows)
+
+    response = TestClient(app).get("/api/v1/chat/sessions")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["id"] for item in body["items"]] == [str(session_id)]
+    assert body["next_cursor"] is None